@@ -1,23 +1,65 @@
+import time
+_import_started = time.perf_counter()
+
+import argparse
 import asyncio
+import aiohttp
 import websockets
 import json
 import threading
 import queue
-import time
 import base64
-import subprocess
+import bisect
+import gc
+import hashlib
+import os
+import secrets
+import selectors
+import signal
+import socket
+import struct
+import unicodedata
+from collections import OrderedDict, deque
 import numpy as np
-import sounddevice as sd
-from TTS.api import TTS
 import wave
 import io
-from concurrent.futures import ThreadPoolExecutor
+import sys
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import Future, ProcessPoolExecutor
+from http import HTTPStatus
+from types import SimpleNamespace
 import logging
 
+try:
+    import soundfile  # Optional: compressed audio formats
+except ImportError:
+    soundfile = None
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Cold-start timing breakdown, reported once the server is ready
+STARTUP_TIMINGS = {'module_import_seconds': time.perf_counter() - _import_started}
+
+# Coqui TTS takes seconds to import, so TTS.api is only imported by load_tts()
+TTS = None
+
+
+def load_tts(model_name):
+    """Load a Coqui TTS model, importing TTS.api on first use
+
+    Models that can synthesize several sentences in one forward pass get a
+    tts_batch() method (see ForwardTTSBatcher).
+    """
+    global TTS
+    if TTS is None:
+        started = time.perf_counter()
+        from TTS.api import TTS
+        STARTUP_TIMINGS['tts_import_seconds'] = time.perf_counter() - started
+    return ForwardTTSBatcher.attach(TTS(model_name))
+
 # Compatible TTS models (don't require PyTorch 2.1+)
 COMPATIBLE_MODELS = {
     "1": {
@@ -46,242 +88,2653 @@ COMPATIBLE_MODELS = {
     }
 }
 
-class WebSocketAudioPlayer:
-    """Handles threaded audio generation and streaming to WebSocket clients"""
-    # FIX 1: Accept the event loop in the constructor
-    def __init__(self, tts_engine, websocket, loop, speaker=None, language="en"):
-        self.tts_engine = tts_engine
-        self.speaker = speaker
-        self.language = language
-        self.websocket = websocket
-        self.loop = loop  # Store the event loop
+# Synthesized once per model before it serves requests (empty disables warm-up)
+DEFAULT_WARMUP_TEXT = "Hello! The assistant is warming up."
+
+# Audio transports a client can negotiate with a `configure` message.
+# 'json' is the legacy base64-WAV `audio_chunk` message; 'binary' sends each
+# chunk as a binary WebSocket frame laid out as:
+#   uint32 little-endian header length | JSON header | raw PCM samples
+# The JSON header is space-padded so the PCM payload starts on an even offset
+# (browsers need that to view it as an Int16Array without copying).
+AUDIO_TRANSPORTS = ('json', 'binary')
+AUDIO_FRAME_PREFIX = struct.Struct('<I')
+AUDIO_FRAME_FORMAT = 'pcm_s16le'
+
+# Progressive streaming (configure with 'stream_audio': true) sends each chunk
+# as 'audio_frame' messages of frame_ms of PCM, numbered by seq, with
+# 'final': true on the chunk's last frame
+STREAM_FRAME_MS_RANGE = (20, 100)
+DEFAULT_STREAM_FRAME_MS = 40
+
+
+def to_int16(audio):
+    """Convert float audio in [-1, 1] (or int16 audio) to int16, saturating instead of wrapping"""
+    if audio.dtype == np.int16:
+        return audio
+    scaled = np.multiply(audio, 32767, dtype=np.float32)
+    np.clip(scaled, -32768, 32767, out=scaled)
+    return scaled.astype(np.int16)
+
+
+def pcm16_bytes(audio):
+    """Little-endian int16 bytes for float or int16 audio"""
+    return to_int16(audio).astype('<i2', copy=False).tobytes()
+
+
+def numpy_to_wav_bytes(audio, sample_rate):
+    """Convert numpy array to WAV bytes"""
+    # Create WAV file in memory
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)  # Mono
+        wav_file.setsampwidth(2)  # 16-bit
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm16_bytes(audio))
+
+    return buffer.getvalue()
+
+
+class AudioPostProcessor:
+    """Trims silence, evens out loudness and converts to int16 without wrap-around
+
+    Works in per-thread buffers that are reused across chunks, so process()
+    returns a view that is only valid until the next call on the same thread.
+    """
+    def __init__(self, trim_threshold_db=-40.0, trim_padding_ms=40, target_dbfs=-20.0, max_gain_db=12.0,
+                 peak_limit=0.98, frame_ms=10):
+        self.trim_threshold = 10 ** (trim_threshold_db / 10)  # Energy ratio to the loudest frame
+        self.trim_padding_ms = trim_padding_ms
+        self.target_rms = 10 ** (target_dbfs / 20)
+        self.max_gain = 10 ** (max_gain_db / 20)
+        self.peak_limit = peak_limit
+        self.frame_ms = frame_ms
+        self.local = threading.local()
+
+    def _buffer(self, name, size, dtype):
+        buffer = getattr(self.local, name, None)
+        if buffer is None or len(buffer) < size:
+            buffer = np.empty(max(size, 2 * len(buffer) if buffer is not None else size), dtype=dtype)
+            setattr(self.local, name, buffer)
+        return buffer[:size]
+
+    def process(self, audio, sample_rate, trim=True):
+        """Return (int16 audio, milliseconds of silence trimmed)"""
+        length = len(audio)
+        samples = self._buffer('samples', length, np.float32)
+        if audio.dtype == np.int16:
+            np.multiply(audio, 1 / 32767, out=samples, casting='unsafe')
+        else:
+            samples[:] = audio
+
+        start, end = 0, length
+        gain = 1.0
+        frame = max(1, int(sample_rate * self.frame_ms / 1000))
+        frame_count = length // frame
+        if frame_count:
+            # Mean energy per frame, computed on a reshaped view without copying
+            frames = samples[:frame_count * frame].reshape(frame_count, frame)
+            energy = np.einsum('ij,ij->i', frames, frames) / frame
+            loudest = energy.max()
+            if loudest > 0:
+                voiced = np.flatnonzero(energy > loudest * self.trim_threshold)
+                if trim:
+                    padding = int(sample_rate * self.trim_padding_ms / 1000)
+                    start = max(0, voiced[0] * frame - padding)
+                    end = min(length, (voiced[-1] + 1) * frame + padding)
+
+                # Bring speech to the same loudness in every chunk, without clipping
+                rms = np.sqrt(energy[voiced].mean())
+                gain = min(self.target_rms / rms, self.max_gain)
+
+        kept = samples[start:end]
+        if len(kept):
+            peak = max(float(kept.max()), -float(kept.min()))
+            if peak * gain > self.peak_limit:
+                gain = self.peak_limit / peak
+
+        # Saturating conversion, in place
+        np.multiply(kept, gain * 32767, out=kept)
+        np.clip(kept, -32768, 32767, out=kept)
+        out = self._buffer('pcm', len(kept), np.int16)
+        np.copyto(out, kept, casting='unsafe')
 
-        # Queues for communication between threads
-        self.text_queue = queue.Queue()
+        trimmed_ms = (length - len(kept)) * 1000 / sample_rate
+        return out, trimmed_ms
 
-        # Threading control
-        self.generator_thread = None
-        self.stop_event = threading.Event()
-        self.is_generating = threading.Event()
 
-        # Thread pool for async operations
-        self.executor = ThreadPoolExecutor(max_workers=2)
+# Low-pass filters used by resample_audio, by (source rate, target rate)
+_RESAMPLE_FILTERS = {}
+_RESAMPLE_FILTER_TAPS = 63
 
-        # Start the threads
-        self.start_threads()
 
-    def start_threads(self):
-        """Start the audio generation thread"""
-        self.stop_event.clear()
+def _resample_filter(src_rate, dst_rate):
+    key = (src_rate, dst_rate)
+    taps = _RESAMPLE_FILTERS.get(key)
+    if taps is None:
+        # Windowed-sinc low-pass just under the new Nyquist frequency
+        cutoff = 0.45 * dst_rate / src_rate
+        n = np.arange(_RESAMPLE_FILTER_TAPS) - (_RESAMPLE_FILTER_TAPS - 1) / 2
+        taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.blackman(_RESAMPLE_FILTER_TAPS)
+        taps = (taps / taps.sum()).astype(np.float32)
+        _RESAMPLE_FILTERS[key] = taps
+    return taps
 
-        # Thread for generating audio from text
-        self.generator_thread = threading.Thread(target=self._audio_generator_worker, daemon=True)
-        self.generator_thread.start()
 
-    def _audio_generator_worker(self):
-        """Worker thread that generates audio from text and sends to WebSocket"""
-        while not self.stop_event.is_set():
-            try:
-                # Get text from queue (with timeout to check stop_event)
-                text_data = self.text_queue.get(timeout=0.1)
+def resample_audio(audio, src_rate, dst_rate):
+    """Resample mono audio with an anti-aliasing FIR and linear interpolation, keeping its dtype"""
+    if src_rate == dst_rate or len(audio) == 0:
+        return audio
+
+    samples = audio.astype(np.float32)
+    if dst_rate < src_rate:
+        samples = np.convolve(samples, _resample_filter(src_rate, dst_rate), mode='same')
+
+    out_length = int(len(samples) * dst_rate / src_rate)
+    positions = np.arange(out_length, dtype=np.float64) * (src_rate / dst_rate)
+    resampled = np.interp(positions, np.arange(len(samples)), samples)
+
+    if audio.dtype == np.int16:
+        return np.clip(resampled, -32768, 32767).astype(np.int16)
+    return resampled.astype(np.float32)
+
+
+# G.711 segment end points for the 14-bit (mu-law) and 13-bit (A-law) magnitudes
+_MULAW_SEGMENT_ENDS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+_ALAW_SEGMENT_ENDS = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+
+
+def mulaw_encode(audio):
+    """Vectorized G.711 mu-law encoding of int16 or float audio"""
+    pcm = to_int16(audio).astype(np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(pcm), 8159) + 0x21
+    segment = np.searchsorted(_MULAW_SEGMENT_ENDS, magnitude)
+    value = (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F)
+    value = np.where(segment >= 8, 0x7F, value)
+    return (value ^ mask).astype(np.uint8)
+
+
+def alaw_encode(audio):
+    """Vectorized G.711 A-law encoding of int16 or float audio"""
+    pcm = to_int16(audio).astype(np.int32) >> 3
+    negative = pcm < 0
+    mask = np.where(negative, 0x55, 0xD5)
+    magnitude = np.where(negative, -pcm - 1, pcm)
+    segment = np.searchsorted(_ALAW_SEGMENT_ENDS, magnitude)
+    shift = np.where(segment < 2, 1, segment)
+    value = (segment << 4) | ((magnitude >> shift) & 0x0F)
+    value = np.where(segment >= 8, 0x7F, value)
+    return (value ^ mask).astype(np.uint8)
+
+
+class AudioEncoder:
+    """Turns synthesized audio into the bytes sent to a client"""
+    name = None
+    streamable = False  # Stateless per-sample codecs can encode progressive frames
+
+    def encode(self, audio, sample_rate):
+        raise NotImplementedError
 
-                if text_data is None:  # Poison pill to stop thread
-                    break
 
-                text = text_data['text']
-                chunk_id = text_data.get('chunk_id', 0)
+class WavEncoder(AudioEncoder):
+    name = 'wav'
+
+    def encode(self, audio, sample_rate):
+        return numpy_to_wav_bytes(audio, sample_rate)
 
-                logger.info(f"Generating audio for chunk {chunk_id}: {text[:50]}...")
 
-                # Set generating flag
-                self.is_generating.set()
+class PCM16Encoder(AudioEncoder):
+    name = 'pcm_s16le'
+    streamable = True
 
+    def encode(self, audio, sample_rate):
+        return pcm16_bytes(audio)
+
+
+class MuLawEncoder(AudioEncoder):
+    name = 'mulaw'
+    streamable = True
+
+    def encode(self, audio, sample_rate):
+        return mulaw_encode(audio).tobytes()
+
+
+class ALawEncoder(AudioEncoder):
+    name = 'alaw'
+    streamable = True
+
+    def encode(self, audio, sample_rate):
+        return alaw_encode(audio).tobytes()
+
+
+class SoundFileEncoder(AudioEncoder):
+    """Compressed container written through libsndfile (python-soundfile)"""
+    def __init__(self, name, container, subtype, sample_rates=None):
+        self.name = name
+        self.container = container
+        self.subtype = subtype
+        self.sample_rates = sample_rates
+
+    def encode(self, audio, sample_rate):
+        if self.sample_rates and sample_rate not in self.sample_rates:
+            # e.g. Opus only accepts 8/12/16/24/48 kHz
+            target = min((rate for rate in self.sample_rates if rate >= sample_rate), default=max(self.sample_rates))
+            audio = resample_audio(audio, sample_rate, target)
+            sample_rate = target
+        buffer = io.BytesIO()
+        soundfile.write(buffer, to_int16(audio), sample_rate, format=self.container, subtype=self.subtype)
+        return buffer.getvalue()
+
+
+AUDIO_ENCODERS = {encoder.name: encoder for encoder in (WavEncoder(), PCM16Encoder(), MuLawEncoder(), ALawEncoder())}
+
+if soundfile is not None:
+    _available = soundfile.available_formats()
+    if 'FLAC' in _available:
+        AUDIO_ENCODERS['flac'] = SoundFileEncoder('flac', 'FLAC', 'PCM_16')
+    if 'OGG' in _available and 'OPUS' in soundfile.available_subtypes('OGG'):
+        AUDIO_ENCODERS['opus'] = SoundFileEncoder('opus', 'OGG', 'OPUS', (8000, 12000, 16000, 24000, 48000))
+    elif 'OGG' in _available and 'VORBIS' in soundfile.available_subtypes('OGG'):
+        AUDIO_ENCODERS['vorbis'] = SoundFileEncoder('vorbis', 'OGG', 'VORBIS')
+
+# Output rates a client may ask for (None keeps the model's native rate)
+OUTPUT_SAMPLE_RATES = (8000, 16000, 22050, 24000, 44100, 48000)
+
+
+def pack_binary_frame(header, payload):
+    """Build a binary frame around already-encoded audio bytes"""
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    if (AUDIO_FRAME_PREFIX.size + len(header_bytes)) % 2:
+        header_bytes += b' '
+    return AUDIO_FRAME_PREFIX.pack(len(header_bytes)) + header_bytes + payload
+
+
+def pack_audio_frame(header, audio):
+    """Build a binary audio frame, writing int16 samples straight into the frame buffer"""
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    offset = AUDIO_FRAME_PREFIX.size + len(header_bytes)
+    if offset % 2:
+        header_bytes += b' '
+        offset += 1
+
+    frame = bytearray(offset + audio.size * 2)
+    AUDIO_FRAME_PREFIX.pack_into(frame, 0, len(header_bytes))
+    frame[AUDIO_FRAME_PREFIX.size:offset] = header_bytes
+
+    pcm = np.frombuffer(frame, dtype='<i2', offset=offset)
+    pcm[:] = to_int16(audio)
+    return frame
+
+
+def with_request_id(message, request_id):
+    """Tag an outgoing message with the request it answers"""
+    if request_id is not None:
+        message['request_id'] = request_id
+    return message
+
+
+class ClientSession:
+    """Per-client state negotiated over a WebSocket connection, which it can outlive
+
+    Everything the server sends after 'connected' goes through send(), which
+    numbers messages 1, 2, 3... and keeps the most recent ones in a bounded
+    replay buffer. JSON messages carry their number as 'message_seq'; audio
+    frames (binary, or JSON 'audio_frame') don't, so clients count every
+    message they receive. If the connection drops, running requests keep
+    generating into the buffer; a new connection can send
+    {'type': 'resume', 'token': ..., 'last_message_seq': ...} (or
+    'last_chunk_id', plus 'request_id' when several requests ran) to take
+    the session over and receive what it missed. Clients trim the buffer by
+    acknowledging what they have received with {'type': 'ack', ...} and the
+    same fields; an acknowledged chunk can still be resumed from.
+    """
+    def __init__(self, websocket, replay_messages=256, replay_bytes=8 * 1024 * 1024):
+        self.websocket = websocket  # None while detached
+        self.token = secrets.token_urlsafe(16)
+        self.audio_transport = 'json'
+
+        # Outgoing messages: last seq used and a ring buffer of
+        # (seq, payload, request_id, chunk_id, kind) for replay
+        self.seq = 0
+        self.replay = deque()
+        self.replay_size = 0
+        self.replay_messages = replay_messages
+        self.replay_bytes = replay_bytes
+        self.acked_chunks = {}  # request_id -> (chunk_id, seq) of its last acknowledged chunk
+        self.send_lock = asyncio.Lock()
+        self.detached_at = None
+        self.expiry = None  # Timer that ends a detached session
+
+        # TTS model (a LoadedModel held from the ModelRegistry) and voice
+        self.model = None
+        self.speaker = None
+        self.model_task = None
+
+        # Audio encoding (None: WAV over JSON, raw PCM over binary) and output rate
+        self.audio_format = None
+        self.output_sample_rate = None
+
+        # Progressive PCM streaming (off: one audio_chunk per sentence)
+        self.stream_audio = False
+        self.frame_ms = DEFAULT_STREAM_FRAME_MS
+
+        # Requests being handled, by request_id. Requests sent without an id
+        # run one after another (the legacy behaviour), tracked by last_untagged_task.
+        self.requests = {}
+        self.last_untagged_task = None
+        self.request_counter = 0
+
+    def next_request_id(self):
+        """Server-assigned id for a request the client didn't tag"""
+        self.request_counter += 1
+        return f"auto-{self.request_counter}"
+
+    async def send(self, message, request_id=None, chunk_id=None):
+        """Number, buffer and (if connected) send a message: a dict is sent as JSON, bytes/str as they are"""
+        async with self.send_lock:
+            self.seq += 1
+            kind = 'audio'
+            if isinstance(message, dict):
+                kind = message.get('type')
+                request_id = message.get('request_id', request_id)
+                chunk_id = message.get('chunk_id', chunk_id)
+                message = json.dumps({**message, 'message_seq': self.seq})
+            self._remember(self.seq, message, request_id, chunk_id, kind)
+
+            if self.websocket is not None:
                 try:
-                    # Generate audio
-                    if self.speaker:
-                        audio = self.tts_engine.tts(text=text, speaker=self.speaker, language=self.language)
+                    await self.websocket.send(message)
+                except websockets.exceptions.ConnectionClosed:
+                    pass  # Kept for replay; the connection's handler detaches the session
+
+    def _remember(self, seq, message, request_id, chunk_id, kind):
+        self.replay.append((seq, message, request_id, chunk_id, kind))
+        self.replay_size += len(message)
+        while self.replay and (len(self.replay) > self.replay_messages or self.replay_size > self.replay_bytes):
+            self.replay_size -= len(self.replay.popleft()[1])
+
+    def replay_after(self, last_seq=None, last_chunk_id=None, request_id=None):
+        """Buffered messages a client that saw up to last_seq (or the audio of last_chunk_id) is missing
+
+        Returns (entries, missed), where missed counts messages that have
+        already left the buffer, or None if last_chunk_id isn't buffered.
+        """
+        extra = set()
+        if last_seq is None:
+            found = self._chunk_seq(last_chunk_id, request_id)
+            if found is None:
+                return None
+            last_seq, extra, _ = found
+
+        entries = [entry for entry in self.replay if entry[0] > last_seq or entry[0] in extra]
+        oldest = self.replay[0][0] if self.replay else self.seq + 1
+        return entries, max(0, oldest - last_seq - 1)
+
+    def _chunk_seq(self, last_chunk_id, request_id=None):
+        """(seq of a chunk's last audio message, seqs of later chunks' text sent ahead of it, request_id)"""
+        matches = [entry for entry in self.replay
+                   if entry[3] == last_chunk_id and entry[4] in ('audio', 'audio_chunk', 'audio_frame')
+                   and (request_id is None or entry[2] == request_id)]
+        if matches:
+            last_seq, request_id = matches[-1][0], matches[-1][2]
+        else:
+            acked = [(rid, seq) for rid, (chunk_id, seq) in self.acked_chunks.items()
+                     if chunk_id == last_chunk_id and (request_id is None or rid == request_id)]
+            if not acked:
+                return None
+            request_id, last_seq = acked[-1]
+        extra = {entry[0] for entry in self.replay
+                 if entry[0] < last_seq and entry[2] == request_id and entry[4] == 'text_chunk'
+                 and entry[3] is not None and entry[3] > last_chunk_id}
+        return last_seq, extra, request_id
+
+    def acknowledge(self, last_seq=None, last_chunk_id=None, request_id=None):
+        """Drop buffered messages the client confirmed receiving, returning how many, or None for an unknown chunk"""
+        keep = set()
+        if last_seq is None:
+            found = self._chunk_seq(last_chunk_id, request_id)
+            if found is None:
+                return None
+            last_seq, keep, request_id = found
+            self.acked_chunks[request_id] = (last_chunk_id, last_seq)  # Still resumable once dropped
+
+        dropped = 0
+        kept = deque()
+        for entry in self.replay:
+            if entry[0] <= last_seq and entry[0] not in keep:
+                self.replay_size -= len(entry[1])
+                dropped += 1
+            else:
+                kept.append(entry)
+        self.replay = kept
+        return dropped
+
+    async def attach(self, websocket, entries, missed):
+        """Continue the session on a new connection, replaying entries before any new message"""
+        async with self.send_lock:
+            self.websocket = websocket
+            self.detached_at = None
+            if self.expiry is not None:
+                self.expiry.cancel()
+                self.expiry = None
+
+            await websocket.send(json.dumps({
+                'type': 'resumed',
+                'session_token': self.token,
+                'replayed': len(entries),
+                'missed': missed,
+                'last_message_seq': self.seq,
+                'requests': [request_id for request_id, task in self.requests.items() if not task.done()]
+            }))
+            for entry in entries:
+                await websocket.send(entry[1])
+
+
+def normalize_tts_text(text):
+    """Normalize text so equivalent sentences share a synthesis cache entry"""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+class SynthesisCache:
+    """Byte-bounded LRU of synthesized audio with an optional memory-mapped disk tier"""
+    def __init__(self, max_bytes=64 * 1024 * 1024, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(model_name, speaker, language, text):
+        """Build a cache key from everything that changes the synthesized audio"""
+        raw = '\x1f'.join([model_name or '', speaker or '', language or '', normalize_tts_text(text)])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        """Return cached audio for key, or None on a miss"""
+        with self.lock:
+            audio = self.entries.get(key)
+            if audio is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return audio
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                # Memory-mapped so a warm restart only pages in what is replayed
+                audio = np.load(path, mmap_mode='r')
+            except FileNotFoundError:
+                audio = None
+            except (ValueError, OSError) as e:
+                # Unreadable entry: remove it so the next put() rewrites it
+                logger.warning(f"Dropping corrupt synthesis cache entry {path}: {e}")
+                audio = None
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            if audio is not None:
+                with self.lock:
+                    self.disk_hits += 1
+                    self._insert(key, audio)
+                return audio
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, audio):
+        """Store synthesized audio in memory and, if configured, on disk"""
+        audio = np.asarray(audio)
+        if audio.dtype not in (np.float32, np.int16):
+            audio = audio.astype(np.float32)
+        if audio.nbytes > self.max_bytes:
+            return audio
+
+        with self.lock:
+            self._insert(key, audio)
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            if not os.path.exists(path):
+                # Unique per process and thread: forked server workers share thread idents
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                try:
+                    with open(tmp_path, 'wb') as f:
+                        np.save(f, audio)
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    logger.warning(f"Could not write synthesis cache entry: {e}")
+        return audio
+
+    def _insert(self, key, audio):
+        # Caller holds self.lock
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.current_bytes -= previous.nbytes
+        self.entries[key] = audio
+        self.current_bytes += audio.nbytes
+
+        while self.current_bytes > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss/eviction counters"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class SentenceSegmenter:
+    """Incrementally splits streamed LLM text into chunks sized for TTS
+
+    The first chunk is cut early (at the first clause boundary once it has
+    first_min_chars) so audio can start while the model is still generating.
+    Later chunks are kept between min_chars and max_chars so TTS jobs stay
+    balanced. Abbreviations, initials and decimals never end a sentence.
+    """
+    ABBREVIATIONS = frozenset({
+        'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'mt', 'vs', 'etc',
+        'e.g', 'i.e', 'cf', 'al', 'approx', 'dept', 'est', 'fig', 'inc', 'ltd',
+        'co', 'corp', 'no', 'vol', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul',
+        'aug', 'sep', 'sept', 'oct', 'nov', 'dec', 'a.m', 'p.m', 'u.s', 'u.k'
+    })
+    SENTENCE_END = '.!?'
+    CLAUSE_END = ',;:'
+    CLOSERS = '"\')]}\u201d\u2019'
+
+    def __init__(self, first_min_chars=12, first_max_chars=60, min_chars=40, max_chars=200):
+        self.first_min_chars = first_min_chars
+        self.first_max_chars = first_max_chars
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.chunks_emitted = 0
+        self._reset('')
+
+    def _reset(self, buffer):
+        self.buffer = buffer
+        self.scan_pos = 0
+        self.sentence_ends = []  # Offsets just past sentence boundaries
+        self.clause_ends = []  # Offsets just past clause boundaries
+
+    def feed(self, delta):
+        """Add a text delta and return any chunks that are ready"""
+        self.buffer += delta
+        chunks = []
+        while True:
+            chunk = self._next_chunk()
+            if chunk is None:
+                return chunks
+            if chunk:
+                chunks.append(chunk)
+
+    def flush(self):
+        """Return whatever text is left at the end of the stream"""
+        chunks = []
+        while len(self.buffer) > self._limits()[1]:
+            chunk = self._split_long()
+            if chunk:
+                chunks.append(chunk)
+        chunk = self._emit(len(self.buffer))
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _limits(self):
+        if self.chunks_emitted == 0:
+            return self.first_min_chars, self.first_max_chars
+        return self.min_chars, self.max_chars
+
+    def _scan(self):
+        buffer = self.buffer
+        # Stop one short of the end: a boundary needs the following character
+        end = len(buffer) - 1
+        i = self.scan_pos
+        while i < end:
+            char = buffer[i]
+            if char == '\n':
+                self.sentence_ends.append(i + 1)
+            elif char in self.SENTENCE_END or char in self.CLAUSE_END:
+                j = i + 1
+                while j < end and buffer[j] in self.CLOSERS:
+                    j += 1
+                if buffer[j].isspace():
+                    if char in self.CLAUSE_END:
+                        self.clause_ends.append(j)
+                    elif char != '.' or not self._is_abbreviation(i):
+                        self.sentence_ends.append(j)
+                elif j == end:
+                    # Closers run up to the end of the buffer: decide on the next feed
+                    break
+                i = j
+                continue
+            i += 1
+        self.scan_pos = i
+
+    def _is_abbreviation(self, dot):
+        """Whether the period at offset dot belongs to an abbreviation, initial or list number"""
+        start = dot
+        while start > 0 and not self.buffer[start - 1].isspace():
+            start -= 1
+        word = self.buffer[start:dot].lstrip('"\'([{\u201c\u2018').lower()
+        if not word:
+            return False
+        if word in self.ABBREVIATIONS:
+            return True
+        if len(word) == 1 and word.isalpha():
+            return True  # Initials such as "J. R. R. Tolkien"
+        if word.isdigit():
+            # "1." opening a line is a list marker, "in 2024." ends a sentence
+            line_start = self.buffer.rfind('\n', 0, start) + 1
+            return not self.buffer[line_start:start].strip()
+        return False
+
+    def _next_chunk(self):
+        self._scan()
+        min_chars, max_chars = self._limits()
+
+        for end in self.sentence_ends:
+            if end >= min_chars:
+                return self._emit(end)
+        if self.chunks_emitted == 0:
+            for end in self.clause_ends:
+                if end >= min_chars:
+                    return self._emit(end)
+
+        if len(self.buffer) > max_chars:
+            return self._split_long()
+        return None
+
+    def _split_long(self):
+        """Cut an over-long buffer at the best boundary before the limit"""
+        max_chars = self._limits()[1]
+        self._scan()
+        for boundaries in (self.sentence_ends, self.clause_ends):
+            candidates = [end for end in boundaries if end <= max_chars]
+            if candidates:
+                return self._emit(candidates[-1])
+        space = self.buffer.rfind(' ', 0, max_chars + 1)
+        return self._emit(space if space > 0 else max_chars)
+
+    def _emit(self, end):
+        chunk = self.buffer[:end].strip()
+        self._reset(self.buffer[end:].lstrip())
+        if chunk:
+            self.chunks_emitted += 1
+        return chunk
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with fixed bucket upper bounds"""
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self):
+        """Return bucket counts (non-cumulative), sum and count"""
+        with self.lock:
+            buckets = {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+            buckets['+Inf'] = self.counts[-1]
+            return {'buckets': buckets, 'sum': self.total, 'count': self.count}
+
+    def export(self):
+        """Raw bucket counts, for merging into another process's histogram"""
+        with self.lock:
+            return {'counts': list(self.counts), 'sum': self.total, 'count': self.count}
+
+    def merge(self, exported):
+        """Add counts from another histogram's export() (same buckets)"""
+        with self.lock:
+            self.counts = [mine + theirs for mine, theirs in zip(self.counts, exported['counts'])]
+            self.total += exported['sum']
+            self.count += exported['count']
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None if empty or beyond the last bound)"""
+        with self.lock:
+            if not self.count:
+                return None
+            target = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= target:
+                    return bound
+            return None
+
+    def prometheus(self, name, help_text):
+        """Render as a Prometheus text-format histogram"""
+        with self.lock:
+            lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            cumulative = 0
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+            lines.append(f"{name}_sum {self.total}")
+            lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5)
+
+
+class StageMetrics:
+    """Latency histograms for each stage of a response, exported as Prometheus text
+
+    When disabled, observe() returns straight away, so instrumented code only
+    pays for a couple of time.perf_counter() calls.
+    """
+    STAGES = {
+        'llm_first_token_seconds': ("Time from a request to the first LLM token", LATENCY_BUCKETS),
+        'time_to_first_audio_seconds': ("Time from a request to its first audio sent", LATENCY_BUCKETS),
+        'synthesis_queue_wait_seconds': ("Time sentences wait for a synthesis worker", LATENCY_BUCKETS),
+        'synthesis_seconds': ("TTS inference time per sentence (per batch when batched)", LATENCY_BUCKETS),
+        'synthesis_rtf': ("Synthesis seconds per second of audio produced", RTF_BUCKETS),
+        'encode_seconds': ("Post-processing and encoding time per chunk or frame batch", LATENCY_BUCKETS),
+        'send_seconds': ("WebSocket send time per audio message", LATENCY_BUCKETS),
+    }
+
+    def __init__(self, enabled=True, prefix='tts_'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.histograms = {name: Histogram(buckets) for name, (_, buckets) in self.STAGES.items()}
+
+    def observe(self, stage, value):
+        if self.enabled:
+            self.histograms[stage].observe(value)
+
+    def export(self):
+        return {stage: histogram.export() for stage, histogram in self.histograms.items()}
+
+    @classmethod
+    def merged(cls, exports):
+        """Combine export()s from several processes into one StageMetrics"""
+        metrics = cls()
+        for exported in exports:
+            for stage, histogram in exported.items():
+                if stage in metrics.histograms:
+                    metrics.histograms[stage].merge(histogram)
+        return metrics
+
+    def summary(self):
+        """Count, mean and approximate p50/p99 (bucket upper bounds) per stage"""
+        summary = {}
+        for stage, histogram in self.histograms.items():
+            snapshot = histogram.snapshot()
+            summary[stage] = {
+                'count': snapshot['count'],
+                'mean': snapshot['sum'] / snapshot['count'] if snapshot['count'] else None,
+                'p50': histogram.quantile(0.5),
+                'p99': histogram.quantile(0.99)
+            }
+        return summary
+
+    def prometheus(self, gauges=None):
+        """Render every stage histogram, plus the given {name: (help, value)} gauges"""
+        lines = []
+        for stage, (help_text, _) in self.STAGES.items():
+            lines.extend(self.histograms[stage].prometheus(self.prefix + stage, help_text))
+        for name, (help_text, value) in (gauges or {}).items():
+            lines.extend([f"# HELP {self.prefix}{name} {help_text}", f"# TYPE {self.prefix}{name} gauge",
+                          f"{self.prefix}{name} {value}"])
+        return "\n".join(lines) + "\n"
+
+
+class SynthesisJob:
+    """A sentence waiting for a synthesis worker, resolved through its future"""
+    def __init__(self, text, speaker=None, language=None, deadline=None, owner=None, on_audio=None):
+        self.text = text
+        self.speaker = speaker
+        self.language = language
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.deadline = self.enqueued_at if deadline is None else deadline
+        self.owner = owner  # Session the job belongs to, for fairness
+        self.on_audio = on_audio  # Called from the worker with audio as it is produced
+
+
+class DeadlineScheduler:
+    """Earliest-deadline-first queue of synthesis jobs with per-session in-flight limits
+
+    Jobs are handed out in order of their playback deadline, so the chunk a
+    listener will need soonest is synthesized first. A session that already
+    has session_inflight_limit jobs running is passed over while another
+    session has work waiting; if nobody else is waiting it is served anyway,
+    so workers never sit idle.
+    """
+    def __init__(self, session_inflight_limit=1):
+        self.session_inflight_limit = max(1, session_inflight_limit)
+        self.pending = []
+        self.inflight = {}
+        self.pills = 0
+        self.condition = threading.Condition()
+
+    def put(self, job):
+        """Queue a job, or None to stop one worker"""
+        with self.condition:
+            if job is None:
+                self.pills += 1
+            else:
+                self.pending.append(job)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Take the most urgent eligible job, raising queue.Empty on timeout"""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                if self.pills:
+                    self.pills -= 1
+                    return None
+                if self.pending:
+                    job = self._pop_next()
+                    self.inflight[job.owner] = self.inflight.get(job.owner, 0) + 1
+                    return job
+
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self.condition.wait(remaining)
+
+    def _pop_next(self):
+        # Caller holds self.condition; the queue is short, so a linear scan is cheapest
+        best = None
+        best_eligible = None
+        for index, job in enumerate(self.pending):
+            if best is None or job.deadline < self.pending[best].deadline:
+                best = index
+            if self.inflight.get(job.owner, 0) < self.session_inflight_limit:
+                if best_eligible is None or job.deadline < self.pending[best_eligible].deadline:
+                    best_eligible = index
+        return self.pending.pop(best if best_eligible is None else best_eligible)
+
+    def done(self, job):
+        """Mark a job taken with get() as finished"""
+        with self.condition:
+            count = self.inflight.get(job.owner, 0) - 1
+            if count > 0:
+                self.inflight[job.owner] = count
+            else:
+                self.inflight.pop(job.owner, None)
+            self.condition.notify_all()
+
+    def drain(self):
+        """Remove and return every queued job, dropping any unclaimed stop pills"""
+        with self.condition:
+            jobs, self.pending = self.pending, []
+            self.pills = 0
+            return jobs
+
+    def qsize(self):
+        with self.condition:
+            return len(self.pending)
+
+
+def long_term_spectrum_db(audio, n_fft=1024):
+    """Average magnitude spectrum in dB, insensitive to timing differences between renditions"""
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+    if len(audio) < n_fft:
+        audio = np.pad(audio, (0, n_fft - len(audio)))
+    frames = np.lib.stride_tricks.sliding_window_view(audio, n_fft)[::n_fft // 2]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(n_fft), axis=1)).mean(axis=0)
+    return 20 * np.log10(spectrum + 1e-8)
+
+
+def tts_arguments(engine, speaker=None, language=None):
+    """Speaker and language keywords for engine.tts(), passing only what the model accepts
+
+    Multi-speaker models get speaker, or their first speaker; only
+    multilingual models get a language ('en' by default).
+    """
+    arguments = {}
+    speakers = getattr(engine, 'speakers', None)
+    if speakers:
+        arguments['speaker'] = speaker or speakers[0]
+    if getattr(engine, 'is_multi_lingual', False):
+        arguments['language'] = language or 'en'
+    return arguments
+
+
+class CPUInferenceOptimizer:
+    """Opt-in CPU tuning applied to each engine as it is loaded
+
+    Sets torch's intra-op/inter-op thread counts, runs the engine's synthesis
+    calls under torch.inference_mode, and optionally swaps Linear/LSTM/GRU
+    layers for dynamically quantized int8 versions. Quantization is only kept
+    if a reference sentence still matches the fp32 rendition: duration within
+    max_duration_change and long-term spectrum within max_spectral_distance_db.
+    """
+    QUANTIZABLE_MODULES = ('tts_model', 'vocoder_model')
+
+    def __init__(self, intra_op_threads=None, inter_op_threads=None, quantize=False,
+                 reference_text="The quick brown fox jumps over the lazy dog.",
+                 max_duration_change=0.15, max_spectral_distance_db=3.0):
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.quantize = quantize
+        self.reference_text = reference_text
+        self.max_duration_change = max_duration_change
+        self.max_spectral_distance_db = max_spectral_distance_db
+
+    def configure_threads(self):
+        import torch
+        if self.intra_op_threads:
+            torch.set_num_threads(self.intra_op_threads)
+        if self.inter_op_threads:
+            try:
+                torch.set_num_interop_threads(self.inter_op_threads)
+            except RuntimeError as e:  # Only allowed before the first parallel op
+                logger.warning(f"Could not set inter-op threads: {e}")
+
+    def apply(self, engine):
+        """Optimize a loaded engine in place and return it"""
+        import torch
+        self.configure_threads()
+
+        synthesizer = getattr(engine, 'synthesizer', None)
+        if self.quantize and synthesizer is not None:
+            self._quantize(engine, synthesizer)
+
+        # No autograd bookkeeping during synthesis
+        for name in ('tts', 'tts_batch'):
+            if hasattr(engine, name):
+                setattr(engine, name, torch.inference_mode()(getattr(engine, name)))
+        model = getattr(synthesizer, 'tts_model', None)
+        if hasattr(model, 'inference_stream'):
+            model.inference_stream = torch.inference_mode()(model.inference_stream)
+        return engine
+
+    def _quantize(self, engine, synthesizer):
+        import torch
+        layers = {torch.nn.Linear, torch.nn.LSTM, torch.nn.GRU}
+        reference = self._reference_audio(engine)
+
+        originals = {}
+        for name in self.QUANTIZABLE_MODULES:
+            module = getattr(synthesizer, name, None)
+            if isinstance(module, torch.nn.Module):
+                originals[name] = module
+                setattr(synthesizer, name, torch.ao.quantization.quantize_dynamic(module, layers, dtype=torch.qint8))
+        if not originals:
+            return
+
+        quantized = self._reference_audio(engine)
+        duration_change = abs(len(quantized) - len(reference)) / max(len(reference), 1)
+        distance = float(np.sqrt(np.mean(
+            (long_term_spectrum_db(quantized) - long_term_spectrum_db(reference)) ** 2
+        )))
+        if duration_change > self.max_duration_change or distance > self.max_spectral_distance_db:
+            logger.warning(f"Int8 quantization changed the output too much (duration {duration_change:.1%}, "
+                           f"spectrum {distance:.2f} dB); keeping fp32 weights")
+            for name, module in originals.items():
+                setattr(synthesizer, name, module)
+            return
+        logger.info(f"Int8 dynamic quantization applied to {', '.join(originals)} "
+                    f"(duration {duration_change:.1%}, spectrum {distance:.2f} dB from fp32)")
+
+    def _reference_audio(self, engine):
+        import torch
+        torch.manual_seed(0)  # Tacotron's prenet dropout stays on at inference
+        with torch.inference_mode():
+            audio = engine.tts(text=self.reference_text, **tts_arguments(engine))
+        return np.asarray(audio, dtype=np.float32)
+
+
+class TextFrontendCache:
+    """Memoizes an engine's text front-end: cleaning, number expansion and phonemization
+
+    Coqui runs every sentence through tokenizer.text_to_ids(), which cleans
+    the text, expands numbers and abbreviations and (for phoneme models)
+    calls the phonemizer, before the model sees a single token. apply()
+    wraps that per engine with bounded LRU tables shared by every engine it
+    is applied to and keyed by model:
+
+    - phrases: sentence -> token ids, so a repeated sentence skips the
+      front-end entirely (XTTS's tokenizer.encode() is memoized the same way).
+      The result is exactly what the uncached front-end returns.
+    - words (opt-in, max_words > 0): word -> phonemes, so a new sentence
+      made only of known words never reaches the phonemizer. Phonemizers
+      are context-sensitive ("the" before a vowel, past-tense "read"), so a
+      word is only learned when its phonemes alone match its phonemes in
+      context, and is dropped for good once two contexts disagree. A word
+      seen in only one of its readings can still be reused in the other,
+      which is why this table is off by default.
+
+    Tables can be saved to and reloaded from a JSON file, and pre-populated
+    by running a vocabulary file (one word or phrase per line) through each
+    engine as it is loaded. In process mode each inference process keeps
+    its own tables; only the server process's are saved.
+    """
+    def __init__(self, max_phrases=20000, max_words=0, path=None, vocabulary_path=None):
+        self.max_phrases = max_phrases
+        self.max_words = max_words
+        self.path = path
+        self.vocabulary_path = vocabulary_path
+        self.phrases = OrderedDict()  # (model, language, text) -> tuple of token ids
+        self.words = OrderedDict()  # (model, language, separator, word) -> phonemes, or False if context-dependent
+        self.lock = threading.Lock()
+
+        # Counters: phrases served from the table or converted, and phonemizer
+        # calls answered from known words or passed through
+        self.counts = {'phrase_hits': 0, 'phrase_misses': 0, 'word_hits': 0, 'word_misses': 0}
+
+        if self.path:
+            self.load()
+
+    def __getstate__(self):
+        # Sent to inference processes with the tables loaded so far
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _get(self, table, key):
+        with self.lock:
+            value = table.get(key)
+            if value is not None:
+                table.move_to_end(key)
+            return value
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def _put(self, table, key, value, limit):
+        with self.lock:
+            table[key] = value
+            table.move_to_end(key)
+            while len(table) > limit:
+                table.popitem(last=False)
+
+    def apply(self, engine):
+        """Memoize a loaded engine's tokenizer in place and return the engine"""
+        model = getattr(getattr(engine, 'synthesizer', None), 'tts_model', None)
+        tokenizer = getattr(model, 'tokenizer', None)
+        namespace = getattr(engine, 'model_name', None) or type(model).__name__
+
+        if hasattr(tokenizer, 'text_to_ids'):
+            tokenizer.text_to_ids = self._memoize_phrases(namespace, tokenizer.text_to_ids, 'language')
+            phonemizer = getattr(tokenizer, 'phonemizer', None)
+            if self.max_words and getattr(tokenizer, 'use_phonemes', False) and hasattr(phonemizer, '_phonemize'):
+                phonemizer._phonemize = self._memoize_words(namespace, phonemizer)
+        elif hasattr(tokenizer, 'preprocess_text') and hasattr(tokenizer, 'encode'):
+            tokenizer.encode = self._memoize_phrases(namespace, tokenizer.encode, 'lang')  # XTTS
+        else:
+            logger.warning(f"No text front-end to memoize for {namespace}")
+            return engine
+
+        if self.vocabulary_path:
+            self.prepopulate(tokenizer, namespace)
+        return engine
+
+    def _memoize_phrases(self, namespace, to_ids, language_arg):
+        def cached_to_ids(text, *args, **kwargs):
+            language = args[0] if args else kwargs.get(language_arg)
+            key = (namespace, language, text)
+            ids = self._get(self.phrases, key)
+            if ids is not None:
+                self._count('phrase_hits')
+                return list(ids)
+            self._count('phrase_misses')
+            ids = to_ids(text, *args, **kwargs)
+            self._put(self.phrases, key, tuple(ids), self.max_phrases)
+            return ids
+
+        cached_to_ids.uncached = to_ids
+        return cached_to_ids
+
+    def _memoize_words(self, namespace, phonemizer):
+        # Called by phonemizer.phonemize() for each stretch of text between punctuation
+        phonemize = phonemizer._phonemize
+
+        def cached_phonemize(text, separator):
+            language = getattr(phonemizer, 'language', None)
+            words = text.split()
+            known = [self._get(self.words, (namespace, language, separator, word)) for word in words]
+            if words and all(isinstance(phonemes, str) for phonemes in known):
+                self._count('word_hits')
+                return ' '.join(known)
+
+            self._count('word_misses')
+            phonemes = phonemize(text, separator)
+            split = phonemes.split()
+            if len(split) == len(words):
+                for word, word_phonemes, previous in zip(words, split, known):
+                    key = (namespace, language, separator, word)
+                    if previous is False or previous == word_phonemes:
+                        continue
+                    if previous is None and phonemize(word, separator).strip() == word_phonemes:
+                        self._put(self.words, key, word_phonemes, self.max_words)
                     else:
-                        audio = self.tts_engine.tts(text=text)
+                        self._put(self.words, key, False, self.max_words)  # Depends on context
+            return phonemes
+
+        cached_phonemize.uncached = phonemize
+        return cached_phonemize
+
+    def prepopulate(self, tokenizer, namespace):
+        """Run every line of the vocabulary file through the memoized front-end"""
+        started = time.perf_counter()
+        before = len(self.phrases)
+        try:
+            with open(self.vocabulary_path, encoding='utf-8') as f:
+                entries = [line.strip() for line in f if line.strip()]
+        except OSError as e:
+            logger.warning(f"Could not read front-end vocabulary {self.vocabulary_path}: {e}")
+            return
+
+        if hasattr(tokenizer, 'text_to_ids'):
+            convert = tokenizer.text_to_ids
+        else:
+            def convert(text):
+                return tokenizer.encode(text, lang='en')  # XTTS needs a language; the server speaks English
+        for entry in entries[:self.max_phrases]:
+            try:
+                convert(entry)
+            except Exception as e:
+                logger.debug(f"Skipping vocabulary entry {entry!r}: {e}")
+        logger.info(f"Front-end cache for {namespace} pre-populated with {len(self.phrases) - before} phrase(s) "
+                    f"in {time.perf_counter() - started:.2f}s")
 
-                    # Ensure audio is numpy array
-                    if not isinstance(audio, np.ndarray):
-                        audio = np.array(audio)
+    def load(self):
+        """Read tables saved by save(), if the file exists"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load front-end cache {self.path}: {e}")
+            return
+
+        for *key, ids in saved.get('phrases', [])[-self.max_phrases:]:
+            self.phrases[tuple(key)] = tuple(ids)
+        for *key, phonemes in (saved.get('words', [])[-self.max_words:] if self.max_words else []):
+            self.words[tuple(key)] = phonemes
+        logger.info(f"Loaded front-end cache: {len(self.phrases)} phrase(s), {len(self.words)} word(s)")
+
+    def save(self):
+        """Write both tables, least recently used first, to path"""
+        if not self.path:
+            return
+        with self.lock:
+            saved = {
+                'phrases': [[*key, list(ids)] for key, ids in self.phrases.items()],
+                'words': [[*key, phonemes] for key, phonemes in self.words.items()]
+            }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(saved, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save front-end cache: {e}")
+
+    def stats(self):
+        """Return table sizes and hit/miss counters"""
+        with self.lock:
+            return {
+                'phrases': len(self.phrases),
+                'max_phrases': self.max_phrases,
+                'words': len(self.words),
+                'max_words': self.max_words,
+                **self.counts
+            }
 
-                    # Get sample rate
-                    sample_rate = getattr(self.tts_engine.synthesizer, 'output_sample_rate', 22050)
 
-                    # Convert to WAV format for web streaming
-                    audio_bytes = self._numpy_to_wav_bytes(audio, sample_rate)
+# Model loaded by each process-pool inference worker (see _process_worker_init)
+_process_engine = None
 
-                    # Encode as base64 for JSON transmission
-                    audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
 
-                    # FIX 3: Use the stored event loop from the main thread
-                    asyncio.run_coroutine_threadsafe(
-                        self._send_audio_chunk(audio_base64, chunk_id, text),
-                        self.loop
-                    )
+def _process_worker_init(model_name, torch_threads, worker_counter, loaded_counter, optimizer=None, frontend=None):
+    """Load the model once per inference process and pin its torch threads"""
+    global _process_engine
 
-                except Exception as e:
-                    logger.error(f"Audio generation error for chunk {chunk_id}: {e}")
-                    # FIX 3: Use the stored event loop from the main thread
-                    asyncio.run_coroutine_threadsafe(
-                        self._send_error(f"Audio generation failed: {str(e)}"),
-                        self.loop
-                    )
-                finally:
-                    # Clear generating flag
-                    self.is_generating.clear()
+    with worker_counter.get_lock():
+        index = worker_counter.value
+        worker_counter.value += 1
+
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads)
+
+        # Give each worker its own block of cores so processes don't contend
+        if hasattr(os, 'sched_setaffinity'):
+            cpus = sorted(os.sched_getaffinity(0))
+            start = (index * torch_threads) % len(cpus)
+            pinned = {cpus[(start + offset) % len(cpus)] for offset in range(min(torch_threads, len(cpus)))}
+            os.sched_setaffinity(0, pinned)
+
+    _process_engine = load_tts(model_name)
+    if optimizer is not None:
+        optimizer.apply(_process_engine)
+    if frontend is not None:
+        frontend.apply(_process_engine)
+    with loaded_counter.get_lock():
+        loaded_counter.value += 1
+    logger.info(f"Inference process {index} (pid {os.getpid()}) loaded {model_name} "
+                f"with {torch_threads or 'default'} torch thread(s)")
+
+
+def _process_worker_ready():
+    return os.getpid()
+
+
+def _process_worker_describe():
+    """What the server process needs to know about the model, without loading it there"""
+    speakers = getattr(_process_engine, 'speakers', None)
+    return {
+        'speakers': list(speakers) if speakers else None,
+        'is_multi_lingual': bool(getattr(_process_engine, 'is_multi_lingual', False)),
+        'sample_rate': SynthesisService.sample_rate(_process_engine),
+        'batch': hasattr(_process_engine, 'tts_batch'),
+        'resident_bytes': model_resident_bytes(_process_engine)
+    }
+
+
+class InferenceProcessEngine:
+    """Stands in for a model that only the inference processes load (process mode)
+
+    The server process needs a model's speakers, languages and sample rate,
+    not its weights, so it keeps this instead of another resident copy.
+    SynthesisService fills it in from a worker once the processes are up.
+    """
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.speakers = None
+        self.is_multi_lingual = False
+        self.synthesizer = SimpleNamespace(output_sample_rate=22050)
+        self.supports_batch = False
+        self.resident_bytes = 0  # Weights across every inference process
+
+    def describe(self, description, processes):
+        self.speakers = description['speakers']
+        self.is_multi_lingual = description['is_multi_lingual']
+        self.synthesizer.output_sample_rate = description['sample_rate']
+        self.supports_batch = description['batch']
+        self.resident_bytes = description['resident_bytes'] * processes
+
+
+def _process_worker_synthesize(text, speaker, language):
+    """Synthesize in an inference process, returning int16 audio through shared memory"""
+    audio = _process_engine.tts(text=text, **tts_arguments(_process_engine, speaker, language))
+    audio = np.asarray(audio, dtype=np.float32)
+    sample_rate = getattr(_process_engine.synthesizer, 'output_sample_rate', 22050)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(audio.size * 2, 1))
+    try:
+        samples = np.ndarray(audio.shape, dtype=np.int16, buffer=shm.buf)
+        np.clip(audio, -1.0, 1.0, out=audio)
+        np.multiply(audio, 32767, out=samples, casting='unsafe')
+        del samples  # Release the buffer export before closing
+    finally:
+        shm.close()
+    return shm.name, audio.size, sample_rate
+
+
+def _process_worker_synthesize_batch(texts, speakers, languages):
+    """Synthesize a batch in one forward pass, returning one shared memory block per sentence"""
+    audios = _process_engine.tts_batch(texts=texts, speakers=speakers, languages=languages)
+    sample_rate = getattr(_process_engine.synthesizer, 'output_sample_rate', 22050)
+
+    results = []
+    for audio in audios:
+        audio = np.asarray(audio, dtype=np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=max(audio.size * 2, 1))
+        try:
+            samples = np.ndarray(audio.shape, dtype=np.int16, buffer=shm.buf)
+            np.clip(audio, -1.0, 1.0, out=audio)
+            np.multiply(audio, 32767, out=samples, casting='unsafe')
+            del samples
+        finally:
+            shm.close()
+        results.append((shm.name, audio.size, sample_rate))
+    return results
+
+
+def _read_shared_audio(name, size):
+    """Copy int16 audio out of a worker's shared memory block and free it"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        audio = np.ndarray((size,), dtype=np.int16, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    return audio
+
+
+class ForwardTTSBatcher:
+    """Batched inference for non-autoregressive Coqui models (FastPitch, FastSpeech)
+
+    Coqui's tts() synthesizes one sentence at a time, but a ForwardTTS model
+    can run a whole batch through one forward pass: token ids are padded to
+    the longest sentence and masked, padded positions get no frames, and the
+    mel spectrograms go through the vocoder together, each edge-padded to the
+    longest (as the vocoder pads a single input). Every waveform is then cut
+    back to its own length. Convolutions still see a few padded positions at
+    the end of shorter sentences, so these differ slightly (around 1% RMS,
+    most of it in the last milliseconds) from unbatched output.
+
+    Autoregressive models (Tacotron2, XTTS) decode step by step with
+    per-sentence stopping and are left unbatched.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+
+    @staticmethod
+    def supports(engine):
+        synthesizer = getattr(engine, 'synthesizer', None)
+        model = getattr(synthesizer, 'tts_model', None)
+        vocoder = getattr(synthesizer, 'vocoder_model', None)
+        if model is None or vocoder is None:
+            return False  # Griffin-Lim vocoding isn't batched
+        if not all(hasattr(model, name) for name in ('format_durations', 'duration_predictor',
+                                                     '_forward_encoder', '_forward_decoder')):
+            return False
+        if hasattr(model, 'emb_g') or getattr(model.args, 'use_d_vector_file', False):
+            return False  # Single-speaker models only
+        return synthesizer.vocoder_config['audio']['sample_rate'] == model.ap.sample_rate
+
+    @classmethod
+    def attach(cls, engine):
+        """Give engine a tts_batch() method if its model supports batching, and return it"""
+        if cls.supports(engine):
+            engine.tts_batch = cls(engine).tts_batch
+            logger.info(f"Batched inference enabled for {getattr(engine, 'model_name', 'the model')}")
+        return engine
+
+    def tts_batch(self, texts, speakers=None, languages=None):
+        """Synthesize texts in one forward pass, returning a float32 waveform per text"""
+        import torch
+        from TTS.tts.utils.helpers import sequence_mask
+        from TTS.tts.utils.synthesis import trim_silence
+
+        synthesizer = self.engine.synthesizer
+        model = synthesizer.tts_model
+        vocoder = synthesizer.vocoder_model
+        device = next(model.parameters()).device
+
+        ids = [model.tokenizer.text_to_ids(text) for text in texts]
+        lengths = torch.tensor([len(sequence) for sequence in ids], dtype=torch.long, device=device)
+        x = torch.zeros(len(ids), int(lengths.max()), dtype=torch.long, device=device)
+        for row, sequence in enumerate(ids):
+            x[row, :len(sequence)] = torch.tensor(sequence, dtype=torch.long, device=device)
+        x_mask = torch.unsqueeze(sequence_mask(lengths, x.shape[1]), 1).float()
+
+        with torch.inference_mode():
+            # ForwardTTS.inference(), with a length per sentence instead of one for all
+            o_en, x_mask, g, _ = model._forward_encoder(x, x_mask, None)
+            o_dr_log = model.duration_predictor(o_en, x_mask)
+            o_dr = (model.format_durations(o_dr_log, x_mask) * x_mask).squeeze(1)
+            y_lengths = o_dr.sum(1)
+            if model.args.use_pitch:
+                o_pitch_emb, _ = model._forward_pitch_predictor(o_en, x_mask)
+                o_en = o_en + o_pitch_emb
+            if model.args.use_energy:
+                o_energy_emb, _ = model._forward_energy_predictor(o_en, x_mask)
+                o_en = o_en + o_energy_emb
+            mels, _ = model._forward_decoder(o_en, o_dr, x_mask, y_lengths, g=None)
+
+            # Renormalize each spectrogram for the vocoder, as Synthesizer.tts() does
+            frames = [int(count) for count in y_lengths.tolist()]
+            inputs = []
+            for row, count in enumerate(frames):
+                mel = model.ap.denormalize(mels[row, :count].cpu().numpy().T).T
+                inputs.append(synthesizer.vocoder_ap.normalize(mel.T))
+            longest = max(frames)
+            batch = np.stack([np.pad(mel, ((0, 0), (0, longest - mel.shape[1])), mode='edge') for mel in inputs])
+            waveforms = vocoder.inference(torch.tensor(batch, dtype=torch.float32))
+            waveforms = waveforms.cpu().numpy().reshape(len(texts), -1)
+
+        # The vocoder adds the same number of samples (its own padding) to every input
+        hop_length = synthesizer.vocoder_ap.hop_length
+        extra = waveforms.shape[1] - longest * hop_length
+        audio_config = synthesizer.tts_config.audio
+        trim = 'do_trim_silence' in audio_config and audio_config['do_trim_silence']
+        audios = []
+        for row, count in enumerate(frames):
+            waveform = waveforms[row, :count * hop_length + extra]
+            if trim:
+                waveform = trim_silence(waveform, model.ap)
+            # Same trailing silence tts() appends after each sentence
+            audios.append(np.concatenate([waveform, np.zeros(10000, dtype=np.float32)]).astype(np.float32))
+        return audios
+
+
+class SynthesisService:
+    """Long-lived pool of TTS inference workers shared by every client
+
+    In 'thread' mode each worker owns a model replica (replicate_models=True,
+    loaded through model_loader); without replicas a single worker serves
+    the primary engine, since more threads would only queue on it and pull
+    jobs out of deadline order. In 'process' mode each worker thread feeds its own
+    inference process, which loads the model once and pins its torch
+    threads, sidestepping the GIL. Work is submitted as futures that
+    resolve to (audio, sample_rate).
+
+    With a batch window, a worker that picks up a sentence keeps collecting
+    queued sentences from any session for up to batch_window_ms (or until
+    max_batch_size) and runs them through the engine's tts_batch() in one
+    forward pass. Engines without tts_batch() are never batched, since
+    waiting would only add latency.
+
+    Queued work is ordered by a DeadlineScheduler rather than FIFO.
+    """
+    MODES = ('thread', 'process')
+
+    def __init__(self, engine, model_loader=None, workers=1, replicate_models=False, cache=None, model_name=None,
+                 mode='thread', torch_threads=None, batch_window_ms=0, max_batch_size=8,
+                 session_inflight_limit=1, optimizer=None, metrics=None, frontend=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown inference mode: {mode}")
+        self.engine = engine
+        self.model_loader = model_loader
+        self.workers = max(1, workers)
+        self.replicate_models = replicate_models and model_loader is not None
+        if mode == 'thread' and self.workers > 1 and not self.replicate_models:
+            logger.warning(f"{self.workers} synthesis workers would take turns on one shared model; using 1 "
+                           f"(replicate the model or use process mode for parallel inference)")
+            self.workers = 1
+        self.cache = cache
+        self.model_name = model_name
+        self.mode = mode
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.optimizer = optimizer  # CPUInferenceOptimizer applied in each inference process
+        self.frontend = frontend  # TextFrontendCache applied in each inference process
+        self.metrics = metrics if metrics is not None else StageMetrics(enabled=False)
+
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.batching = self.batch_window > 0 and self.max_batch_size > 1
+        if self.batching and not isinstance(engine, InferenceProcessEngine) and not hasattr(engine, 'tts_batch'):
+            logger.warning("TTS model has no batched inference (tts_batch); dynamic batching disabled")
+            self.batching = False
+
+        self.jobs = DeadlineScheduler(session_inflight_limit)
+        self.threads = []
+        self.engines = []  # (engine, lock) per distinct thread-mode engine
+        self.engine_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.process_pool = None
+
+        # Tuning data for the batch window
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_wait = Histogram([0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5])
+
+    def start(self):
+        """Start the inference workers (again, after shutdown(), reusing the loaded engine)"""
+        self.stop_event.clear()
+        self.engines = []
+
+        if self.mode == 'process':
+            self._start_process_pool()
 
+        for index in range(self.workers):
+            if self.mode == 'process' or index == 0 or not self.replicate_models:
+                engine, lock = self.engine, self.engine_lock
+            else:
+                logger.info(f"Loading model replica for synthesis worker {index}...")
+                engine, lock = self.model_loader(), threading.Lock()
+            if not any(engine is known for known, _ in self.engines):
+                self.engines.append((engine, lock))
+
+            thread = threading.Thread(target=self._worker, args=(index, engine, lock),
+                                      name=f"synthesis-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        if self.mode == 'process':
+            mode = f"inference processes ({self.torch_threads} torch thread(s) each)"
+        else:
+            mode = "model replicas" if self.replicate_models else "a shared model"
+        if self.batching:
+            mode += f", batching up to {self.max_batch_size} sentences within {self.batch_window * 1000:g} ms"
+        logger.info(f"Synthesis service started with {self.workers} worker(s) using {mode}")
+
+    def _start_process_pool(self):
+        context = multiprocessing.get_context('spawn')
+        loaded = context.Value('i', 0)
+        self.process_pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_process_worker_init,
+            initargs=(self.model_name, self.torch_threads, context.Value('i', 0), loaded, self.optimizer,
+                      self.frontend)
+        )
+
+        # Each submission spawns a process until the pool is full; then wait
+        # for every worker to finish loading its model
+        logger.info(f"Starting {self.workers} inference process(es)...")
+        ready = [self.process_pool.submit(_process_worker_ready) for _ in range(self.workers)]
+        while loaded.value < self.workers:
+            failed = [future for future in ready if future.done() and future.exception()]
+            if failed:
+                raise RuntimeError(f"Inference process failed to start: {failed[0].exception()}")
+            time.sleep(0.05)
+        pids = [future.result() for future in ready]
+        logger.info(f"Inference processes ready: {sorted(set(pids))}")
+
+        if isinstance(self.engine, InferenceProcessEngine):
+            self.engine.describe(self.process_pool.submit(_process_worker_describe).result(), self.workers)
+            if self.batching and not self.engine.supports_batch:
+                logger.warning("TTS model has no batched inference (tts_batch); dynamic batching disabled")
+                self.batching = False
+
+    def submit(self, text, speaker=None, language=None, deadline=None, owner=None, on_audio=None):
+        """Queue text for synthesis and return a Future of (audio, sample_rate)
+
+        deadline is the time.perf_counter() value by which the audio should be
+        ready (default: now); owner identifies the session for fairness. If
+        on_audio is given and the model can synthesize incrementally, it is
+        called from the worker thread with each piece of audio as it is made.
+        """
+        job = SynthesisJob(text, speaker, language, deadline, owner, on_audio)
+
+        # Reuse audio for sentences we have already synthesized
+        if self.cache is not None:
+            audio = self.cache.get(SynthesisCache.make_key(self.model_name, speaker, language, text))
+            if audio is not None:
+                logger.info(f"Synthesis cache hit: {text[:50]}...")
+                job.future.set_result((audio, self.sample_rate(self.engine)))
+                return job.future
+
+        self.jobs.put(job)
+        return job.future
+
+    @staticmethod
+    def sample_rate(engine):
+        return getattr(engine.synthesizer, 'output_sample_rate', 22050)
+
+    def warm_up(self, text, speaker=None, language=None):
+        """Synthesize text on every engine so the first request doesn't pay for JIT and allocator warm-up"""
+        if self.mode == 'process':
+            # One submission per process; a busy process leaves the next one to an idle sibling
+            futures = [self.process_pool.submit(_process_worker_synthesize, text, speaker, language)
+                       for _ in range(self.workers)]
+            for future in futures:
+                name, size, _ = future.result()
+                _read_shared_audio(name, size)
+            return
+
+        job = SynthesisJob(text, speaker, language)
+        for engine, lock in self.engines:
+            self._run_inference(engine, lock, job)
+
+    def _worker(self, index, engine, lock):
+        """Worker thread that runs TTS inference for queued jobs"""
+        while not self.stop_event.is_set():
+            try:
+                job = self.jobs.get(timeout=0.1)
             except queue.Empty:
                 continue
-            except Exception as e:
-                logger.error(f"Audio generator worker error: {e}")
+
+            if job is None:  # Poison pill to stop thread
+                break
+
+            # Skip jobs whose response was cancelled while they were queued; queue
+            # wait runs until the batch window closes, when the batch starts
+            collected = self._collect_batch(job)
+            now = time.perf_counter()
+            batch = []
+            for job in collected:
+                if job.future.set_running_or_notify_cancel():
+                    self.queue_wait.observe(now - job.enqueued_at)
+                    self.metrics.observe('synthesis_queue_wait_seconds', now - job.enqueued_at)
+                    batch.append(job)
+                else:
+                    self.jobs.done(job)
+            if not batch:
                 continue
+            self.batch_sizes.observe(len(batch))
 
-    def _numpy_to_wav_bytes(self, audio, sample_rate):
-        """Convert numpy array to WAV bytes"""
-        # Normalize audio to int16
-        if audio.dtype != np.int16:
-            audio = (audio * 32767).astype(np.int16)
+            logger.info(f"Worker {index} generating audio for {len(batch)} sentence(s): {batch[0].text[:50]}...")
+            started = time.perf_counter()
+            try:
+                results = self._run_batch(engine, lock, batch)
+            except Exception as e:
+                results = [e] * len(batch)
+
+            # One observation per forward pass (per batch when batched)
+            if self.metrics.enabled:
+                elapsed = time.perf_counter() - started
+                audio_seconds = sum(len(result[0]) / result[1] for result in results
+                                    if not isinstance(result, Exception))
+                if audio_seconds:
+                    self.metrics.observe('synthesis_seconds', elapsed)
+                    self.metrics.observe('synthesis_rtf', elapsed / audio_seconds)
+
+            for job, result in zip(batch, results):
+                self.jobs.done(job)
+                if isinstance(result, Exception):
+                    job.future.set_exception(result)
+                    continue
 
-        # Create WAV file in memory
-        buffer = io.BytesIO()
-        with wave.open(buffer, 'wb') as wav_file:
-            wav_file.setnchannels(1)  # Mono
-            wav_file.setsampwidth(2)  # 16-bit
-            wav_file.setframerate(sample_rate)
-            wav_file.writeframes(audio.tobytes())
+                audio, sample_rate = result
+                if self.cache is not None:
+                    key = SynthesisCache.make_key(self.model_name, job.speaker, job.language, job.text)
+                    audio = self.cache.put(key, audio)
 
-        return buffer.getvalue()
+                # Ensure audio is numpy array
+                if not isinstance(audio, np.ndarray):
+                    audio = np.array(audio)
+
+                job.future.set_result((audio, sample_rate))
+
+    def _collect_batch(self, first_job):
+        """Gather more queued jobs for up to the batch window"""
+        batch = [first_job]
+        if not self.batching or (first_job.on_audio is not None and self.supports_streaming(self.engine)):
+            return batch
 
-    async def _send_audio_chunk(self, audio_base64, chunk_id, text):
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                job = self.jobs.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                self.jobs.put(None)  # Leave the poison pill for this worker's next loop
+                break
+            batch.append(job)
+        return batch
+
+    def _run_batch(self, engine, lock, batch):
+        """Synthesize a batch, returning (audio, sample_rate) or an exception per job"""
+        if len(batch) == 1:
+            return [self._run_inference(engine, lock, batch[0])]
+
+        texts = [job.text for job in batch]
+        speakers = [job.speaker for job in batch]
+        languages = [job.language for job in batch]
+
+        if self.mode == 'process':
+            shared = self.process_pool.submit(_process_worker_synthesize_batch, texts, speakers, languages).result()
+            return [(_read_shared_audio(name, size), sample_rate) for name, size, sample_rate in shared]
+
+        with lock:
+            audios = engine.tts_batch(texts=texts, speakers=speakers, languages=languages)
+        sample_rate = self.sample_rate(engine)
+        return [(audio, sample_rate) for audio in audios]
+
+    def _run_inference(self, engine, lock, job):
+        """Synthesize one job in this thread or in the worker's inference process"""
+        if self.mode == 'process':
+            name, size, sample_rate = self.process_pool.submit(
+                _process_worker_synthesize, job.text, job.speaker, job.language
+            ).result()
+            return _read_shared_audio(name, size), sample_rate
+
+        if job.on_audio is not None and self.supports_streaming(engine):
+            result = self._run_streaming_inference(engine, lock, job)
+            if result is not None:
+                return result
+
+        with lock:
+            # Generate audio
+            audio = engine.tts(text=job.text, **tts_arguments(engine, job.speaker, job.language))
+        return audio, self.sample_rate(engine)
+
+    def supports_streaming(self, engine):
+        """Whether the model can synthesize incrementally (XTTS v2 inference_stream)"""
+        if self.mode == 'process':
+            return False
+        model = getattr(getattr(engine, 'synthesizer', None), 'tts_model', None)
+        return hasattr(model, 'inference_stream')
+
+    def _run_streaming_inference(self, engine, lock, job):
+        """Synthesize incrementally, handing each piece to job.on_audio as it is produced"""
+        model = engine.synthesizer.tts_model
+        speakers = getattr(getattr(model, 'speaker_manager', None), 'speakers', None) or {}
+        conditioning = speakers.get(job.speaker)
+        if not isinstance(conditioning, dict) or 'gpt_cond_latent' not in conditioning:
+            return None  # No precomputed voice latents, use the regular path
+
+        pieces = []
+        with lock:
+            stream = model.inference_stream(
+                job.text,
+                job.language or 'en',
+                conditioning['gpt_cond_latent'],
+                conditioning['speaker_embedding']
+            )
+            for piece in stream:
+                if hasattr(piece, 'detach'):
+                    piece = piece.detach().cpu().numpy()
+                piece = np.asarray(piece, dtype=np.float32).reshape(-1)
+                pieces.append(piece)
+                job.on_audio(piece)
+
+        audio = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+        return audio, self.sample_rate(engine)
+
+    def stats(self):
+        """Return batching and queueing statistics"""
+        return {
+            'queued': self.jobs.qsize(),
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_seconds': self.queue_wait.snapshot()
+        }
+
+    def shutdown(self):
+        """Stop the workers, failing any jobs still queued"""
+        logger.info("Stopping synthesis service...")
+        self.stop_event.set()
+        for job in self.jobs.drain():
+            job.future.cancel()
+
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.threads = []
+        self.jobs.drain()  # Pills left by workers that saw stop_event first
+
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=True, cancel_futures=True)
+            self.process_pool = None
+        logger.info("Synthesis service stopped")
+
+
+def model_resident_bytes(engine):
+    """Bytes held by a loaded engine's weights and buffers (0 if it has no torch modules)"""
+    if isinstance(engine, InferenceProcessEngine):
+        return engine.resident_bytes
+    synthesizer = getattr(engine, 'synthesizer', None)
+    total = 0
+    for name in ('tts_model', 'vocoder_model'):
+        module = getattr(synthesizer, name, None)
+        if module is None or not hasattr(module, 'parameters'):
+            continue
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def process_rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+class LoadedModel:
+    """A model resident in the ModelRegistry, with the synthesis service that serves it"""
+    def __init__(self, choice, info, engine, synthesis, load_seconds, resident_bytes):
+        self.choice = choice
+        self.info = info
+        self.model_name = info['model']
+        self.language = info['language']
+        self.engine = engine
+        self.synthesis = synthesis
+        self.load_seconds = load_seconds
+        self.resident_bytes = resident_bytes
+        self.warmup_seconds = None
+        self.users = 0
+        self.last_used = time.monotonic()
+
+        # Default speaker, if the model has several
+        speakers = getattr(engine, 'speakers', None)
+        self.speakers = list(speakers) if speakers else []
+        self.speaker = self.speakers[0] if self.speakers else None
+
+    def stats(self):
+        return {
+            'model': self.choice,
+            'name': self.info['name'],
+            'load_seconds': round(self.load_seconds, 3),
+            'resident_mb': round(self.resident_bytes / (1024 * 1024), 1),
+            'warmup_seconds': round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            'users': self.users,
+            'idle_seconds': 0.0 if self.users else round(time.monotonic() - self.last_used, 1)
+        }
+
+
+class ModelRegistry:
+    """Loads TTS models on first use and keeps them under a memory budget
+
+    Models are COMPATIBLE_MODELS entries. Each resident model gets its own
+    SynthesisService from service_factory(engine, model_name). Concurrent
+    requests for a model that is still loading share one load. Once the
+    resident models exceed memory_budget_bytes (0: unlimited), the least
+    recently used ones that nobody holds are shut down and dropped.
+    Models are warmed up with warmup_text (if any) before they are handed out.
+    """
+    def __init__(self, service_factory, loader=None, memory_budget_bytes=0, warmup_text=None):
+        self.service_factory = service_factory
+        self.loader = loader or load_tts
+        self.memory_budget_bytes = memory_budget_bytes
+        self.warmup_text = warmup_text
+        self.models = OrderedDict()  # model_name -> LoadedModel, least recently used first
+        self.loading = {}  # model_name -> Future of LoadedModel
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def resolve(model):
+        """Map a COMPATIBLE_MODELS key or model name to (key, info), or (None, None)"""
+        if model in COMPATIBLE_MODELS:
+            return model, COMPATIBLE_MODELS[model]
+        for choice, info in COMPATIBLE_MODELS.items():
+            if info['model'] == model:
+                return choice, info
+        return None, None
+
+    def acquire(self, model):
+        """Return a Future of the LoadedModel, loading it if needed; release() it when done"""
+        choice, info = self.resolve(model)
+        if info is None:
+            raise KeyError(f'Model "{model}" not available')
+
+        with self.lock:
+            loaded = self.models.get(info['model'])
+            if loaded is not None:
+                self._hold(loaded)
+                future = Future()
+                future.set_result(loaded)
+                return future
+
+            future = self.loading.get(info['model'])
+            if future is None:
+                future = Future()
+                self.loading[info['model']] = future
+                threading.Thread(target=self._load, args=(choice, info, future),
+                                 name=f"model-load-{choice}", daemon=True).start()
+            else:
+                logger.info(f"Waiting for {info['name']} to finish loading...")
+
+        # Every caller holds the model, including those that joined a load in progress
+        held = Future()
+
+        def hold(done):
+            if held.cancelled():
+                return
+            if done.exception() is not None:
+                held.set_exception(done.exception())
+                return
+            self.retain(done.result())
+            held.set_result(done.result())
+
+        future.add_done_callback(hold)
+        return held
+
+    def _hold(self, loaded):
+        loaded.users += 1
+        loaded.last_used = time.monotonic()
+        if loaded.model_name in self.models:
+            self.models.move_to_end(loaded.model_name)
+
+    def retain(self, loaded):
+        """Take another hold on a model the caller already holds"""
+        with self.lock:
+            self._hold(loaded)
+
+    def release(self, loaded):
+        """Give back a model from acquire(), making it eligible for eviction"""
+        with self.lock:
+            loaded.users = max(0, loaded.users - 1)
+            loaded.last_used = time.monotonic()
+        if self._over_budget():
+            threading.Thread(target=self._evict, name="model-evict", daemon=True).start()
+
+    def _load(self, choice, info, future):
+        logger.info(f"Loading {info['name']}...")
+        started = time.perf_counter()
+        rss_before = process_rss_bytes()
+        try:
+            engine = self.loader(info['model'])
+            synthesis = self.service_factory(engine, info['model'])
+            synthesis.start()
+        except Exception as e:
+            logger.error(f"Error loading TTS model {info['model']}: {e}")
+            with self.lock:
+                self.loading.pop(info['model'], None)
+            future.set_exception(e)
+            return
+
+        load_seconds = time.perf_counter() - started
+        # Every distinct engine the service runs: replicas in thread mode, all processes in process mode
+        resident_bytes = (sum(model_resident_bytes(known) for known, _ in synthesis.engines)
+                          or max(0, process_rss_bytes() - rss_before))
+        loaded = LoadedModel(choice, info, engine, synthesis, load_seconds, resident_bytes)
+        logger.info(f"Loaded {info['name']} in {load_seconds:.2f}s "
+                    f"({resident_bytes / (1024 * 1024):.1f} MB resident)")
+
+        if self.warmup_text:
+            started = time.perf_counter()
+            try:
+                synthesis.warm_up(self.warmup_text, loaded.speaker, loaded.language)
+                loaded.warmup_seconds = time.perf_counter() - started
+                logger.info(f"Warmed up {info['name']} in {loaded.warmup_seconds:.2f}s")
+            except Exception as e:
+                logger.warning(f"Warm-up synthesis failed for {info['name']}: {e}")
+
+        with self.lock:
+            self.models[info['model']] = loaded
+            self.loading.pop(info['model'], None)
+        future.set_result(loaded)
+        self._evict()
+
+    def _over_budget(self):
+        with self.lock:
+            return bool(self.memory_budget_bytes) and self.resident_bytes() > self.memory_budget_bytes
+
+    def resident_bytes(self):
+        return sum(loaded.resident_bytes for loaded in self.models.values())
+
+    def _evict(self):
+        """Unload idle models, least recently used first, until within the budget"""
+        evicted = []
+        with self.lock:
+            if not self.memory_budget_bytes:
+                return
+            for loaded in list(self.models.values()):
+                if self.resident_bytes() <= self.memory_budget_bytes:
+                    break
+                if loaded.users == 0:
+                    del self.models[loaded.model_name]
+                    evicted.append(loaded)
+
+        for loaded in evicted:
+            logger.info(f"Evicting {loaded.info['name']} ({loaded.resident_bytes / (1024 * 1024):.1f} MB, "
+                        f"idle {time.monotonic() - loaded.last_used:.0f}s)")
+            loaded.synthesis.shutdown()
+            loaded.engine = None
+
+    def stats(self):
+        """Return resident models (with load times and sizes) and the memory budget"""
+        with self.lock:
+            return {
+                'loaded': [loaded.stats() for loaded in self.models.values()],
+                'loading': [self.resolve(name)[0] for name in self.loading],
+                'resident_mb': round(self.resident_bytes() / (1024 * 1024), 1),
+                'budget_mb': round(self.memory_budget_bytes / (1024 * 1024), 1) if self.memory_budget_bytes else None
+            }
+
+    def stop_services(self):
+        """Stop every resident model's inference threads but keep the models loaded (before forking)"""
+        with self.lock:
+            models = list(self.models.values())
+        for loaded in models:
+            loaded.synthesis.shutdown()
+
+    def start_services(self):
+        """Restart inference threads stopped by stop_services() (in a forked worker)"""
+        with self.lock:
+            models = list(self.models.values())
+        for loaded in models:
+            loaded.synthesis.start()
+
+    def shutdown(self):
+        """Stop every resident model's synthesis service"""
+        with self.lock:
+            models, self.models = list(self.models.values()), OrderedDict()
+        for loaded in models:
+            loaded.synthesis.shutdown()
+
+
+# Rough speaking rate used to predict when queued chunks will be played
+SPEECH_SECONDS_PER_CHAR = 0.065
+
+
+class WebSocketAudioPlayer:
+    """Streams one response's synthesized audio to a WebSocket client in chunk order"""
+    # FIX 1: Accept the event loop in the constructor
+    def __init__(self, synthesis, session, loop, speaker=None, language="en", audio_transport='json', owner=None,
+                 max_pending_chunks=4, request_id=None, stream_audio=False, frame_ms=DEFAULT_STREAM_FRAME_MS,
+                 audio_format=None, output_sample_rate=None, postprocessor=None, metrics=None):
+        self.synthesis = synthesis
+        self.speaker = speaker
+        self.language = language
+        self.session = session  # ClientSession everything is sent through
+        self.loop = loop  # Store the event loop
+        self.audio_transport = audio_transport
+        self.owner = owner
+        self.request_id = request_id
+        self.stream_audio = stream_audio
+        self.frame_ms = frame_ms
+        self.output_sample_rate = output_sample_rate
+        if audio_format is None:
+            audio_format = AUDIO_FRAME_FORMAT if audio_transport == 'binary' or stream_audio else 'wav'
+        self.encoder = AUDIO_ENCODERS[audio_format]
+        self.postprocessor = postprocessor
+        self.metrics = metrics if metrics is not None else StageMetrics(enabled=False)
+        self.started_at = time.perf_counter()
+        self.first_audio_at = None
+
+        # Playback bookkeeping used to give each chunk a synthesis deadline
+        self.playback_started_at = None
+        self.delivered_seconds = 0.0
+        self.queued_seconds = 0.0
+
+        # Chunks submitted for synthesis, in the order they must be sent. The
+        # slots bound how far text may run ahead of delivered audio, so a slow
+        # client or slow synthesis pushes back on the LLM stream.
+        self.pending = asyncio.Queue()
+        self.slots = asyncio.Semaphore(max_pending_chunks)
+        self.stopped = False
+
+        # Sends results as their futures complete
+        self.sender_task = self.loop.create_task(self._audio_sender())
+
+    async def _audio_sender(self):
+        """Wait for each chunk's synthesis in order and send it to the WebSocket"""
+        while True:
+            item = await self.pending.get()
+            if item is None:
+                break
+
+            chunk_id, text, future, estimated_seconds, pieces = item
+            try:
+                if pieces is not None:
+                    await self._stream_chunk(chunk_id, text, future, pieces)
+                    self.queued_seconds -= estimated_seconds
+                    continue
+
+                audio, sample_rate = await asyncio.wrap_future(future)
+
+                # Post-processing, resampling and encoding run off the event loop
+                payload, sample_rate, duration, trimmed_ms = await self.loop.run_in_executor(
+                    None, self._encode_audio, audio, sample_rate, chunk_id, text
+                )
+                if trimmed_ms:
+                    logger.info(f"Trimmed {trimmed_ms:.0f} ms of silence from chunk {chunk_id}")
+
+                if self.playback_started_at is None:
+                    self.playback_started_at = time.perf_counter()
+                self.delivered_seconds += duration
+                self.queued_seconds -= estimated_seconds
+
+                if self.audio_transport == 'binary':
+                    await self._send_audio_frame(payload, chunk_id)
+                else:
+                    await self._send_audio_chunk(payload, chunk_id, text, sample_rate, trimmed_ms)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Audio generation error for chunk {chunk_id}: {e}")
+                await self._send_error(f"Audio generation failed: {str(e)}")
+            finally:
+                self.slots.release()
+
+    async def _stream_chunk(self, chunk_id, text, future, pieces):
+        """Send a chunk as fixed-size PCM frames while it is being synthesized"""
+        seq = 0
+        carry = None
+        streamed = False
+
+        while True:
+            piece = await pieces.get()
+            final = piece is None
+            if final:
+                audio, sample_rate = future.result()
+                if streamed:
+                    audio = audio[:0]  # Everything was already framed piece by piece
+            else:
+                audio, sample_rate = piece, self.synthesis.sample_rate(self.synthesis.engine)
+                streamed = True
+
+            # Framing and encoding run off the event loop
+            payloads, carry, seq = await self.loop.run_in_executor(
+                None, self._frame_audio, carry, audio, sample_rate, chunk_id, text, seq, final
+            )
+            for payload, duration in payloads:
+                if self.playback_started_at is None:
+                    self.playback_started_at = time.perf_counter()
+                self.delivered_seconds += duration
+                await self._send_audio(payload, chunk_id)
+
+            if final:
+                logger.info(f"Streamed audio chunk {chunk_id} in {seq} frame(s)")
+                return
+
+    def _frame_audio(self, carry, audio, sample_rate, chunk_id, text, seq, final):
+        """Cut audio into frame_ms frames, returning payloads, leftover samples and the next seq"""
+        started = time.perf_counter()
+        trimmed_ms = None
+        if self.postprocessor is not None and final and seq == 0 and carry is None:
+            # The whole chunk arrived at once: trim and level it like a regular chunk
+            audio, trimmed_ms = self.postprocessor.process(audio, sample_rate)
+        else:
+            # Incremental pieces can't be trimmed or leveled ahead of time
+            audio = to_int16(audio)
+
+        if self.output_sample_rate:
+            audio = resample_audio(audio, sample_rate, self.output_sample_rate)
+            sample_rate = self.output_sample_rate
+        if carry is not None and len(carry):
+            audio = np.concatenate([carry, audio.astype(carry.dtype, copy=False)])
+        frame_samples = max(1, int(sample_rate * self.frame_ms / 1000))
+
+        if final:
+            count = max(1, -(-len(audio) // frame_samples))
+        else:
+            count = len(audio) // frame_samples
+
+        payloads = []
+        for index in range(count):
+            frame = audio[index * frame_samples:(index + 1) * frame_samples]
+            is_final = final and index == count - 1
+            header = with_request_id({
+                'type': 'audio_frame',
+                'chunk_id': chunk_id,
+                'seq': seq,
+                'final': is_final,
+                'sample_rate': sample_rate,
+                'format': self.encoder.name,
+                'channels': 1
+            }, self.request_id)
+            if seq == 0:
+                header['text'] = text
+                if trimmed_ms is not None:
+                    header['trimmed_ms'] = round(trimmed_ms, 1)
+
+            if self.audio_transport == 'binary':
+                if self.encoder.name == AUDIO_FRAME_FORMAT:
+                    payload = pack_audio_frame(header, frame)
+                else:
+                    payload = pack_binary_frame(header, self.encoder.encode(frame, sample_rate))
+            else:
+                header['audio'] = base64.b64encode(self.encoder.encode(frame, sample_rate)).decode('utf-8')
+                payload = json.dumps(header)
+            payloads.append((payload, len(frame) / sample_rate))
+            seq += 1
+
+        carry = None if final else audio[count * frame_samples:].copy()
+        self.metrics.observe('encode_seconds', time.perf_counter() - started)
+        return payloads, carry, seq
+
+    def _encode_audio(self, audio, sample_rate, chunk_id, text):
+        """Post-process and encode synthesized audio for the negotiated transport and format
+
+        Returns (payload, sample_rate, duration in seconds, milliseconds trimmed).
+        """
+        started = time.perf_counter()
+        trimmed_ms = 0.0
+        if self.postprocessor is not None:
+            audio, trimmed_ms = self.postprocessor.process(audio, sample_rate)
+        duration = len(audio) / sample_rate
+
+        if self.output_sample_rate:
+            audio = resample_audio(audio, sample_rate, self.output_sample_rate)
+            sample_rate = self.output_sample_rate
+
+        if self.audio_transport == 'binary':
+            header = with_request_id({
+                'type': 'audio_chunk',
+                'chunk_id': chunk_id,
+                'sample_rate': sample_rate,
+                'format': self.encoder.name,
+                'channels': 1,
+                'text': text,
+                'trimmed_ms': round(trimmed_ms, 1)
+            }, self.request_id)
+            if self.encoder.name == AUDIO_FRAME_FORMAT:
+                # Raw PCM behind a small header, no WAV or base64 round trip
+                payload = pack_audio_frame(header, audio)
+            else:
+                payload = pack_binary_frame(header, self.encoder.encode(audio, sample_rate))
+        else:
+            # Encode (WAV by default) as base64 for JSON transmission
+            audio_bytes = self.encoder.encode(audio, sample_rate)
+            payload = base64.b64encode(audio_bytes).decode('utf-8')
+
+        self.metrics.observe('encode_seconds', time.perf_counter() - started)
+        return payload, sample_rate, duration, trimmed_ms
+
+    async def _send_audio(self, payload, chunk_id):
+        """Send one audio message, recording send time and time-to-first-audio"""
+        started = time.perf_counter()
+        await self.session.send(payload, request_id=self.request_id, chunk_id=chunk_id)
+        if self.metrics.enabled:
+            finished = time.perf_counter()
+            self.metrics.observe('send_seconds', finished - started)
+            if self.first_audio_at is None:
+                self.first_audio_at = finished
+                self.metrics.observe('time_to_first_audio_seconds', finished - self.started_at)
+
+    async def _send_audio_chunk(self, audio_base64, chunk_id, text, sample_rate, trimmed_ms=0.0):
         """Send audio chunk to WebSocket client"""
         try:
-            message = {
+            message = with_request_id({
                 'type': 'audio_chunk',
                 'audio': audio_base64,
                 'chunk_id': chunk_id,
                 'text': text,
-                'sample_rate': getattr(self.tts_engine.synthesizer, 'output_sample_rate', 22050)
-            }
-            await self.websocket.send(json.dumps(message))
+                'sample_rate': sample_rate,
+                'format': self.encoder.name,
+                'trimmed_ms': round(trimmed_ms, 1)
+            }, self.request_id)
+            await self._send_audio(message, chunk_id)
             logger.info(f"Sent audio chunk {chunk_id}")
         except Exception as e:
             logger.error(f"Failed to send audio chunk: {e}")
 
+    async def _send_audio_frame(self, frame, chunk_id):
+        """Send a binary audio frame to WebSocket client"""
+        try:
+            await self._send_audio(frame, chunk_id)
+            logger.info(f"Sent binary audio chunk {chunk_id} ({len(frame)} bytes)")
+        except Exception as e:
+            logger.error(f"Failed to send audio frame: {e}")
+
     async def _send_error(self, error_message):
         """Send error message to WebSocket client"""
         try:
-            message = {
+            message = with_request_id({
                 'type': 'error',
                 'message': error_message
-            }
-            await self.websocket.send(json.dumps(message))
+            }, self.request_id)
+            await self.session.send(message)
         except Exception as e:
             logger.error(f"Failed to send error message: {e}")
 
-    def add_text(self, text, chunk_id=0):
-        """Add text to be converted to speech"""
-        if not self.stop_event.is_set():
-            self.text_queue.put({'text': text, 'chunk_id': chunk_id})
+    async def add_text(self, text, chunk_id=0):
+        """Add text to be converted to speech, waiting while too many chunks are outstanding"""
+        await self.slots.acquire()
+        if not self.stopped:
+            # Due when everything ahead of it has finished playing; the first
+            # chunk of a response is due immediately and jumps the queue
+            now = time.perf_counter()
+            playback_start = self.playback_started_at or now
+            deadline = max(now, playback_start + self.delivered_seconds) + self.queued_seconds
+
+            estimated_seconds = len(text) * SPEECH_SECONDS_PER_CHAR
+            self.queued_seconds += estimated_seconds
+
+            pieces = None
+            on_audio = None
+            if self.stream_audio:
+                # Audio pieces from the worker thread, then None once the job is done
+                pieces = asyncio.Queue()
+
+                def on_audio(piece):
+                    self.loop.call_soon_threadsafe(pieces.put_nowait, piece)
+
+            future = self.synthesis.submit(text, self.speaker, self.language, deadline=deadline, owner=self.owner,
+                                           on_audio=on_audio)
+            if pieces is not None:
+                future.add_done_callback(lambda _: self.loop.call_soon_threadsafe(pieces.put_nowait, None))
+            self.pending.put_nowait((chunk_id, text, future, estimated_seconds, pieces))
 
     def clear_queue(self):
         """Clear all pending audio"""
-        while not self.text_queue.empty():
+        while not self.pending.empty():
             try:
-                self.text_queue.get_nowait()
-            except queue.Empty:
+                item = self.pending.get_nowait()
+            except asyncio.QueueEmpty:
                 break
+            if item is not None:
+                item[2].cancel()
+
+    async def finish(self):
+        """Wait until every chunk added so far has been sent"""
+        if not self.stopped:
+            self.pending.put_nowait(None)
+            await self.sender_task
 
     def stop(self):
-        """Stop all threads and cleanup"""
+        """Stop sending and cancel any synthesis still queued"""
+        if self.stopped:
+            return
         logger.info("Stopping WebSocket audio player...")
-        self.stop_event.set()
+        self.stopped = True
 
-        # Clear queue
+        # Clear queue; a chunk already on a worker finishes but is never sent
         self.clear_queue()
+        self.sender_task.cancel()
 
-        # Send poison pill to stop thread
-        self.text_queue.put(None)
+        logger.info("WebSocket audio player stopped")
 
-        # Wait for thread to finish
-        if self.generator_thread and self.generator_thread.is_alive():
-            self.generator_thread.join(timeout=2)
 
-        # Shutdown executor
-        self.executor.shutdown(wait=True)
+class LLMBackendUnavailable(Exception):
+    """Raised when an LLM backend cannot reach its model at all"""
+
+
+class LLMBackend:
+    """Interface for language model backends that stream text deltas"""
+    name = "base"
+
+    async def stream(self, prompt, model):
+        """Yield text deltas for prompt as the model generates them"""
+        raise NotImplementedError
+        yield  # Makes this an async generator
+
+    async def complete(self, prompt, model):
+        """Return the whole response for prompt"""
+        parts = []
+        async for delta in self.stream(prompt, model):
+            parts.append(delta)
+        return ''.join(parts)
+
+    async def close(self):
+        """Release any pooled resources"""
+
+
+class OllamaHTTPBackend(LLMBackend):
+    """Streams tokens from Ollama's HTTP API over pooled keep-alive connections"""
+    name = "http"
+
+    def __init__(self, base_url=None, max_connections=16, keepalive_timeout=60, timeout=300):
+        base_url = base_url or os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+        if "://" not in base_url:
+            base_url = f"http://{base_url}"
+        self.base_url = base_url.rstrip('/')
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.session = None
+
+    def _get_session(self):
+        # Created lazily so the pool belongs to the server's running event loop
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=self.timeout)
+            )
+        return self.session
+
+    async def stream(self, prompt, model):
+        payload = {'model': model, 'prompt': prompt, 'stream': True}
+        try:
+            async with self._get_session().post(f"{self.base_url}/api/generate", json=payload) as response:
+                if response.status != 200:
+                    body = await response.text()
+                    raise RuntimeError(f"Ollama HTTP {response.status}: {body.strip()}")
+
+                # Ollama streams one JSON object per line
+                async for line in response.content:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get('error'):
+                        raise RuntimeError(f"Ollama error: {data['error']}")
+                    delta = data.get('response', '')
+                    if delta:
+                        yield delta
+                    if data.get('done'):
+                        break
+        except aiohttp.ClientConnectorError as e:
+            raise LLMBackendUnavailable(f"Cannot reach Ollama at {self.base_url}: {e}") from e
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+
+class OllamaSubprocessBackend(LLMBackend):
+    """Runs `ollama run` per prompt, reading its stdout without blocking the event loop"""
+    name = "subprocess"
+
+    async def stream(self, prompt, model):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "ollama", "run", model,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+        except FileNotFoundError as e:
+            raise LLMBackendUnavailable("Ollama is not installed or not in PATH. Please install Ollama first.") from e
+
+        finished = False
+        try:
+            process.stdin.write((prompt + "\n").encode('utf-8'))
+            await process.stdin.drain()
+            process.stdin.close()
+
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                yield line.decode('utf-8', errors='replace')
+
+            await process.wait()
+            finished = True
+        finally:
+            if not finished and process.returncode is None:
+                # The consumer stopped early, so don't leave the model generating
+                process.kill()
+                await process.wait()
+
+
+class FallbackLLMBackend(LLMBackend):
+    """Uses the primary backend, switching to the fallback if the primary is unreachable"""
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+
+    async def stream(self, prompt, model):
+        try:
+            async for delta in self.primary.stream(prompt, model):
+                yield delta
+            return
+        except LLMBackendUnavailable as e:
+            # Only raised before the first delta, so nothing has been sent yet
+            logger.warning(f"{e}; falling back to {self.fallback.name} backend")
+
+        async for delta in self.fallback.stream(prompt, model):
+            yield delta
+
+    async def close(self):
+        await self.primary.close()
+        await self.fallback.close()
+
+
+def create_llm_backend(kind=None):
+    """Create the LLM backend named by kind or the LLM_BACKEND environment variable"""
+    kind = kind or os.environ.get("LLM_BACKEND", "auto")
+    if kind == "http":
+        return OllamaHTTPBackend()
+    if kind == "subprocess":
+        return OllamaSubprocessBackend()
+    if kind == "auto":
+        return FallbackLLMBackend(OllamaHTTPBackend(), OllamaSubprocessBackend())
+    raise ValueError(f"Unknown LLM backend: {kind}")
 
-        logger.info("WebSocket audio player stopped")
 
 class WebSocketTextToAudioAssistant:
-    def __init__(self, model_choice="1"):
+    def __init__(self, model_choice="1", cache_bytes=64 * 1024 * 1024, cache_dir=None, llm_backend=None,
+                 tts_workers=1, replicate_models=False, inference_mode='thread', torch_threads=None,
+                 batch_window_ms=0, max_batch_size=8, session_inflight_limit=1, max_pending_chunks=4,
+                 max_concurrent_requests=4, postprocess=True, target_dbfs=-20.0, model_loader=None,
+                 model_memory_bytes=0, warmup_text=DEFAULT_WARMUP_TEXT, optimizer=None, metrics=True,
+                 session_ttl=120.0, replay_messages=256, replay_bytes=8 * 1024 * 1024, frontend=None):
         self.tts = None
         self.speaker = None
         self.language = None
-        self.model_choice = model_choice
+        self.model_name = None
+        self.model_choice = model_choice if model_choice in COMPATIBLE_MODELS else "1"
+        self.default_model = None
+        self.synthesis = None
+        self.ready = False  # Reported by /ready and the status message
+        self.startup_timings = {}
+        self.drain_seconds = 30.0  # How long a stopping server lets conversations finish
+        self.cluster_stats = None  # Merged stats of every pre-fork worker, from the supervisor
         self.connected_clients = set()
+        self.client_sessions = {}  # websocket -> the ClientSession it is attached to
+        self.sessions = {}  # session token -> ClientSession, including detached ones
+        self.session_ttl = session_ttl  # How long a disconnected session can be resumed (0: not at all)
+        self.replay_messages = replay_messages
+        self.replay_bytes = replay_bytes
+        self.max_pending_chunks = max_pending_chunks
+        self.max_concurrent_requests = max_concurrent_requests
+
+        # Per-stage latency histograms, served at /metrics and by get_stats
+        self.metrics = StageMetrics(enabled=metrics)
+
+        # Silence trimming, loudness leveling and clip-safe int16 for every chunk
+        self.postprocessor = AudioPostProcessor(target_dbfs=target_dbfs) if postprocess else None
+
+        # Synthesis cache (set cache_bytes=0 to disable, TTS_CACHE_DIR keeps it across restarts)
+        cache_dir = cache_dir or os.environ.get("TTS_CACHE_DIR")
+        self.synthesis_cache = SynthesisCache(cache_bytes, cache_dir) if cache_bytes else None
+
+        # Memoized text cleaning and phonemization (a TextFrontendCache), for sentences the cache misses
+        self.frontend = frontend
+
+        # Language model backend (an LLMBackend instance or a name for create_llm_backend)
+        if llm_backend is None or isinstance(llm_backend, str):
+            llm_backend = create_llm_backend(llm_backend)
+        self.llm_backend = llm_backend
+
+        # Models are loaded on first use, each with its own synthesis service
+        model_loader = model_loader or load_tts
+        if optimizer is not None:
+            base_loader = model_loader
+
+            def model_loader(model_name):
+                return optimizer.apply(base_loader(model_name))
+        if frontend is not None:
+            unmemoized_loader = model_loader
+
+            def model_loader(model_name):
+                return frontend.apply(unmemoized_loader(model_name))
+
+        def create_synthesis(engine, model_name):
+            return SynthesisService(
+                engine,
+                model_loader=lambda: model_loader(model_name),
+                workers=tts_workers,
+                replicate_models=replicate_models,
+                cache=self.synthesis_cache,
+                model_name=model_name,
+                mode=inference_mode,
+                torch_threads=torch_threads,
+                batch_window_ms=batch_window_ms,
+                max_batch_size=max_batch_size,
+                session_inflight_limit=session_inflight_limit,
+                optimizer=optimizer,
+                metrics=self.metrics,
+                frontend=frontend
+            )
+
+        # In process mode only the inference processes load the model (with the
+        # optimizer and front-end cache); this process keeps a description of it
+        registry_loader = InferenceProcessEngine if inference_mode == 'process' else model_loader
+        self.models = ModelRegistry(create_synthesis, loader=registry_loader, memory_budget_bytes=model_memory_bytes,
+                                    warmup_text=warmup_text)
 
         # Initialize TTS
         self._initialize_tts()
 
     def _initialize_tts(self):
-        """Initialize TTS model"""
-        model_info = COMPATIBLE_MODELS.get(self.model_choice, COMPATIBLE_MODELS["1"])
-
-        logger.info(f"Loading {model_info['name']}...")
+        """Load the startup model, which new sessions use and which is never evicted"""
         try:
-            self.tts = TTS(model_info["model"])
-            self.language = model_info["language"]
+            self.default_model = self.models.acquire(self.model_choice).result()
             logger.info("TTS Model loaded successfully!")
-
-            # Select default speaker if available
-            if hasattr(self.tts, 'speakers') and self.tts.speakers:
-                self.speaker = self.tts.speakers[0]
-                logger.info(f"Selected default speaker: {self.speaker}")
-            else:
-                self.speaker = None
-                logger.info("Using default voice (no speaker selection available)")
-
         except Exception as e:
             logger.error(f"Error loading TTS model: {e}")
+            if self.model_choice == "1":
+                raise
             # Fallback to basic model
             try:
                 logger.info("Falling back to basic English model...")
-                self.tts = TTS("tts_models/en/ljspeech/tacotron2-DDC")
-                self.language = "en"
-                self.speaker = None
+                self.default_model = self.models.acquire("1").result()
+                self.model_choice = "1"
                 logger.info("Fallback model loaded successfully!")
             except Exception as fallback_error:
                 logger.error(f"Fallback also failed: {fallback_error}")
                 raise
 
-    def get_ollama_response(self, prompt, model="llama3.2"):
+        self.tts = self.default_model.engine
+        self.language = self.default_model.language
+        self.model_name = self.default_model.model_name
+        self.speaker = self.default_model.speaker
+        self.synthesis = self.default_model.synthesis
+        if self.speaker:
+            logger.info(f"Selected default speaker: {self.speaker}")
+        else:
+            logger.info("Using default voice (no speaker selection available)")
+
+        tts_import = STARTUP_TIMINGS.get('tts_import_seconds', 0.0)
+        self.startup_timings = {
+            'module_import_seconds': STARTUP_TIMINGS['module_import_seconds'],
+            'tts_import_seconds': tts_import,
+            'model_load_seconds': max(0.0, self.default_model.load_seconds - tts_import),
+            'warmup_seconds': self.default_model.warmup_seconds or 0.0
+        }
+
+    async def get_ollama_response(self, prompt, model="llama3.2"):
         """Get AI response from Ollama."""
         try:
-            process = subprocess.Popen(
-                ["ollama", "run", model],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            stdout, stderr = process.communicate(prompt)
-            if stderr and "error" in stderr.lower():
-                logger.warning(f"Ollama warning: {stderr}")
-            return stdout.strip() if stdout.strip() else "I couldn't generate a response."
-        except FileNotFoundError:
-            return "Ollama is not installed or not in PATH. Please install Ollama first."
+            response = await self.llm_backend.complete(prompt, model)
+            return response.strip() if response.strip() else "I couldn't generate a response."
+        except LLMBackendUnavailable as e:
+            return str(e)
         except Exception as e:
             return f"Error connecting to AI: {str(e)}"
 
-    async def stream_ollama_response(self, prompt, websocket, model="llama3.2"):
-        """Get streaming response from Ollama and send to WebSocket"""
+    async def stream_ollama_response(self, prompt, session, model="llama3.2", request_id=None):
+        """Get streaming response from Ollama and send it to the session's client
+
+        Generation carries on while the client is disconnected; what it
+        misses is replayed if it resumes the session.
+        """
         logger.info("AI is thinking and responding...")
 
+        # Hold the session's model for the whole response, even if it switches models meanwhile
+        tts_model = session.model
+        self.models.retain(tts_model)
+
         # FIX 2: Get the running event loop and pass it to the audio player
         loop = asyncio.get_running_loop()
-        audio_player = WebSocketAudioPlayer(self.tts, websocket, loop, self.speaker, self.language)
+        audio_player = WebSocketAudioPlayer(tts_model.synthesis, session, loop, session.speaker, tts_model.language,
+                                            audio_transport=session.audio_transport, owner=session,
+                                            max_pending_chunks=self.max_pending_chunks, request_id=request_id,
+                                            stream_audio=session.stream_audio, frame_ms=session.frame_ms,
+                                            audio_format=session.audio_format,
+                                            output_sample_rate=session.output_sample_rate,
+                                            postprocessor=self.postprocessor, metrics=self.metrics)
 
         try:
             # Make the AI more conversational
@@ -290,102 +2743,212 @@ class WebSocketTextToAudioAssistant:
 User: {prompt}"""
 
             # Notify client that AI is processing
-            await websocket.send(json.dumps({
+            await session.send(with_request_id({
                 'type': 'ai_thinking',
                 'message': 'AI is processing your request...'
-            }))
-
-            process = subprocess.Popen(
-                ["ollama", "run", model],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
-            )
-
-            # Send enhanced prompt
-            process.stdin.write(enhanced_prompt + "\n")
-            process.stdin.flush()
-            process.stdin.close()
+            }, request_id))
 
             full_response = ""
-            current_chunk = ""
             chunk_id = 0
+            segmenter = SentenceSegmenter()
 
-            while True:
-                line = process.stdout.readline()
-                if not line:
-                    break
-
-                line = line.strip()
-                if not line:
-                    continue
-
-                full_response += line + " "
-                current_chunk += line + " "
-
-                # Send text chunk and generate audio when we have a complete sentence
-                if any(punct in current_chunk for punct in ['. ', '! ', '? ', '\n']):
-                    chunk_text = current_chunk.strip()
-
-                    # Send text response chunk
-                    await websocket.send(json.dumps({
-                        'type': 'text_chunk',
-                        'text': chunk_text,
-                        'chunk_id': chunk_id
-                    }))
+            async for delta in self.llm_backend.stream(enhanced_prompt, model):
+                if not full_response:
+                    self.metrics.observe('llm_first_token_seconds', time.perf_counter() - audio_player.started_at)
+                full_response += delta
 
-                    logger.info(f"AI chunk {chunk_id}: {chunk_text}")
-
-                    # Add to audio generation queue
-                    audio_player.add_text(chunk_text, chunk_id)
-
-                    current_chunk = ""
+                # Send text chunks and generate audio as soon as the segmenter releases them
+                for chunk_text in segmenter.feed(delta):
+                    await self._send_text_chunk(session, audio_player, chunk_text, chunk_id)
                     chunk_id += 1
 
             # Handle any remaining text
-            if current_chunk.strip():
-                chunk_text = current_chunk.strip()
-
-                # Send final text chunk
-                await websocket.send(json.dumps({
-                    'type': 'text_chunk',
-                    'text': chunk_text,
-                    'chunk_id': chunk_id
-                }))
-
-                logger.info(f"AI final chunk {chunk_id}: {chunk_text}")
-                audio_player.add_text(chunk_text, chunk_id)
+            for chunk_text in segmenter.flush():
+                await self._send_text_chunk(session, audio_player, chunk_text, chunk_id)
+                chunk_id += 1
 
             # Send completion message
-            await websocket.send(json.dumps({
+            await session.send(with_request_id({
                 'type': 'response_complete',
                 'full_text': full_response.strip()
-            }))
+            }, request_id))
 
-            # Wait a bit for audio generation to complete
-            await asyncio.sleep(1)
+            # Wait for every outstanding audio chunk to be delivered
+            await audio_player.finish()
+            await session.send(with_request_id({
+                'type': 'audio_complete',
+                'chunks': chunk_id
+            }, request_id))
 
             return full_response.strip()
 
+        except asyncio.CancelledError:
+            # Interrupted by the user (or the client went away): the LLM stream
+            # is closed by the cancellation, pending synthesis is dropped below
+            logger.info("Response cancelled")
+            raise
         except Exception as e:
             error_msg = f"Error with streaming: {str(e)}"
             logger.error(error_msg)
 
-            await websocket.send(json.dumps({
+            await session.send(with_request_id({
                 'type': 'error',
                 'message': error_msg
-            }))
+            }, request_id))
             return error_msg
         finally:
             # Clean up audio player
             audio_player.stop()
+            self.models.release(tts_model)
+
+            if self.synthesis_cache is not None:
+                logger.info(f"Synthesis cache: {self.synthesis_cache.stats()}")
+            if tts_model.synthesis.batching:
+                logger.info(f"Synthesis batching: {tts_model.synthesis.stats()}")
+
+    async def _send_text_chunk(self, session, audio_player, chunk_text, chunk_id):
+        """Send a text chunk to the client and queue it for audio generation"""
+        await session.send(with_request_id({
+            'type': 'text_chunk',
+            'text': chunk_text,
+            'chunk_id': chunk_id
+        }, audio_player.request_id))
+
+        logger.info(f"AI chunk {chunk_id}: {chunk_text}")
+
+        # Add to audio generation queue
+        await audio_player.add_text(chunk_text, chunk_id)
+
+    async def _run_response(self, user_text, session, request_id, previous_task=None):
+        """Generate one response, first waiting for previous_task if given"""
+        if previous_task is not None and not previous_task.done():
+            await asyncio.wait([previous_task])
+
+        # Get AI response and stream it
+        try:
+            await self.stream_ollama_response(user_text, session, request_id=request_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Request {request_id} failed for session {session.token[:8]}: {e}")
+
+    async def _change_model(self, session, choice, reply):
+        """Switch a session to another model, loading it first if needed"""
+        future = self.models.acquire(choice)
+        if not future.done():
+            await reply({
+                'type': 'model_loading',
+                'model': choice,
+                'name': COMPATIBLE_MODELS[choice]['name']
+            })
+        try:
+            loaded = await asyncio.wrap_future(future)
+        except Exception as e:
+            await reply({
+                'type': 'error',
+                'message': f'Model "{choice}" failed to load: {e}'
+            })
+            return
+
+        if self.sessions.get(session.token) is not session:
+            self.models.release(loaded)  # The session ended while the model loaded
+            return
+
+        previous, session.model = session.model, loaded
+        session.speaker = loaded.speaker
+        self.models.release(previous)
+
+        await reply({
+            'type': 'model_changed',
+            'model': loaded.choice,
+            'name': loaded.info['name'],
+            'language': loaded.language,
+            'speaker': session.speaker,
+            'available_speakers': loaded.speakers,
+            'load_seconds': round(loaded.load_seconds, 3),
+            'resident_mb': round(loaded.resident_bytes / (1024 * 1024), 1)
+        })
+        logger.info(f"Session {session.token[:8]} switched to {loaded.info['name']}")
+
+    def _detach_session(self, session, websocket):
+        """Keep a session whose connection dropped alive for session_ttl, so it can be resumed"""
+        if session.websocket is not websocket:
+            return  # Already taken over by a resuming connection
+        session.websocket = None
+        if not self.session_ttl:
+            self._end_session(session)
+            return
+        session.detached_at = time.monotonic()
+        session.expiry = asyncio.get_running_loop().call_later(self.session_ttl, self._end_session, session)
+        logger.info(f"Session {session.token[:8]} detached; resumable for {self.session_ttl:g}s")
+
+    def _end_session(self, session):
+        """Stop a session's requests and let go of its model"""
+        if self.sessions.pop(session.token, None) is None:
+            return
+        if session.expiry is not None:
+            session.expiry.cancel()
+            session.expiry = None
+        self._cancel_requests(session)
+        self.models.release(session.model)
+        if session.websocket is None:
+            logger.info(f"Session {session.token[:8]} expired")
+
+    async def _resume_session(self, data, websocket, session, reply):
+        """Move this connection onto the session named by data['token'] and replay what it missed"""
+        target = self.sessions.get(data.get('token'))
+        if target is None or target is session:
+            await reply({
+                'type': 'error',
+                'code': 'unknown_session',
+                'message': 'Session expired or unknown'
+            })
+            return
+
+        last_seq = data.get('last_message_seq')
+        if last_seq is None and data.get('last_chunk_id') is None:
+            last_seq = 0
+        replay = target.replay_after(last_seq, data.get('last_chunk_id'), data.get('request_id'))
+        if replay is None:
+            await reply({
+                'type': 'error',
+                'code': 'unknown_chunk',
+                'message': f'Chunk {data.get("last_chunk_id")} is no longer buffered; resume with last_message_seq'
+            })
+            return
+
+        # A connection still attached to the session (one that hasn't noticed it
+        # dropped) is closed; the fresh session this connection started with is dropped
+        previous = target.websocket
+        self.client_sessions[websocket] = target
+        self._end_session(session)
+        await target.attach(websocket, *replay)
+        if previous is not None and previous is not websocket:
+            asyncio.create_task(previous.close(reason="Session resumed on another connection"))
+        logger.info(f"Session {target.token[:8]} resumed by client {id(websocket)}, "
+                    f"replayed {len(replay[0])} message(s)")
+
+    def _cancel_requests(self, session, request_id=None):
+        """Cancel one request (or all of them), returning the cancelled tasks"""
+        if request_id is None:
+            tasks = list(session.requests.values())
+        else:
+            tasks = [session.requests[request_id]] if request_id in session.requests else []
+        tasks = [task for task in tasks if not task.done()]
+        for task in tasks:
+            task.cancel()
+        return tasks
 
     async def handle_client(self, websocket):
         """Handle WebSocket client connection"""
         client_id = id(websocket)
         self.connected_clients.add(websocket)
+        session = ClientSession(websocket, self.replay_messages, self.replay_bytes)
+        session.model = self.default_model
+        session.speaker = self.default_model.speaker
+        self.models.retain(session.model)
+        self.client_sessions[websocket] = session
+        self.sessions[session.token] = session
         logger.info(f"Client {client_id} connected. Total clients: {len(self.connected_clients)}")
 
         try:
@@ -393,12 +2956,33 @@ User: {prompt}"""
             welcome_message = {
                 'type': 'connected',
                 'message': 'Connected to TTS Assistant',
+                # Reconnect with {'type': 'resume', 'token': ..., 'last_message_seq': ...} to pick up where you
+                # left off; {'type': 'ack', 'last_message_seq': ...} frees what no longer needs replaying
+                'session_token': session.token,
+                'resume': {
+                    'ttl_seconds': self.session_ttl,
+                    'replay_messages': self.replay_messages,
+                    'replay_bytes': self.replay_bytes
+                },
                 'tts_info': {
-                    'model': self.model_choice,
-                    'language': self.language,
-                    'speaker': self.speaker,
-                    'available_speakers': getattr(self.tts, 'speakers', []) if hasattr(self.tts, 'speakers') else []
-                }
+                    'model': session.model.choice,
+                    'language': session.model.language,
+                    'speaker': session.speaker,
+                    'available_speakers': session.model.speakers
+                },
+                # Each session can switch with {'type': 'change_model', 'model': '<key>'}
+                'available_models': {choice: info['name'] for choice, info in COMPATIBLE_MODELS.items()},
+                # Clients opt into binary audio frames with {'type': 'configure', 'audio_transport': 'binary'}
+                'audio_transports': list(AUDIO_TRANSPORTS),
+                'audio_transport': 'json',
+                # ...and into progressive PCM frames with 'stream_audio': true
+                'stream_audio': {
+                    'frame_ms_range': list(STREAM_FRAME_MS_RANGE),
+                    'incremental': session.model.synthesis.supports_streaming(session.model.engine)
+                },
+                # ...and pick an encoding and output rate with 'audio_format' / 'sample_rate'
+                'audio_formats': list(AUDIO_ENCODERS),
+                'sample_rates': list(OUTPUT_SAMPLE_RATES)
             }
             await websocket.send(json.dumps(welcome_message))
 
@@ -409,16 +2993,16 @@ User: {prompt}"""
                     await self.process_message(data, websocket)
                 except json.JSONDecodeError as e:
                     logger.error(f"Invalid JSON from client {client_id}: {e}")
-                    await websocket.send(json.dumps({
+                    await self.client_sessions[websocket].send({
                         'type': 'error',
                         'message': 'Invalid JSON format'
-                    }))
+                    })
                 except Exception as e:
                     logger.error(f"Error processing message from client {client_id}: {e}")
-                    await websocket.send(json.dumps({
+                    await self.client_sessions[websocket].send({
                         'type': 'error',
                         'message': f'Server error: {str(e)}'
-                    }))
+                    })
 
         except websockets.exceptions.ConnectionClosed:
             logger.info(f"Client {client_id} disconnected")
@@ -426,113 +3010,934 @@ User: {prompt}"""
             logger.error(f"Error handling client {client_id}: {e}")
         finally:
             self.connected_clients.discard(websocket)
+            session = self.client_sessions.pop(websocket, None)
+            if session is not None:
+                self._detach_session(session, websocket)
             logger.info(f"Client {client_id} removed. Total clients: {len(self.connected_clients)}")
 
     async def process_message(self, data, websocket):
-        """Process incoming message from WebSocket client"""
+        """Process incoming message from WebSocket client
+
+        Long-running requests (user_message) run as their own tasks, so control
+        messages are answered immediately. Replies carry the request_id the
+        client sent, if any.
+        """
         message_type = data.get('type', '')
+        request_id = data.get('request_id')
+        session = self.client_sessions.get(websocket)
+
+        async def reply(message):
+            await session.send(with_request_id(message, request_id))
 
         if message_type == 'user_message':
             user_text = data.get('text', '').strip()
             if user_text:
+                active = [task for task in session.requests.values() if not task.done()]
+                if len(active) >= self.max_concurrent_requests:
+                    await reply({
+                        'type': 'error',
+                        'code': 'too_many_requests',
+                        'message': f'At most {self.max_concurrent_requests} requests may run at once'
+                    })
+                    return
+                if request_id is not None and request_id in session.requests:
+                    await reply({
+                        'type': 'error',
+                        'code': 'duplicate_request_id',
+                        'message': f'Request "{request_id}" is already running'
+                    })
+                    return
+
                 logger.info(f"User message: {user_text}")
 
+                # Untagged requests keep the old one-at-a-time ordering;
+                # tagged ones run concurrently
+                untagged = request_id is None
+                previous_task = None
+                if untagged:
+                    request_id = session.next_request_id()
+                    previous_task = session.last_untagged_task
+
                 # Send acknowledgment
-                await websocket.send(json.dumps({
+                await reply({
                     'type': 'message_received',
                     'original_text': user_text
-                }))
+                })
+
+                task = asyncio.create_task(
+                    self._run_response(user_text, session, request_id, previous_task)
+                )
+                if untagged:
+                    session.last_untagged_task = task
+                session.requests[request_id] = task
+                task.add_done_callback(lambda _, rid=request_id: session.requests.pop(rid, None))
+
+        elif message_type == 'resume':
+            await self._resume_session(data, websocket, session, reply)
+
+        elif message_type == 'ack':
+            # Not answered, so acknowledging doesn't itself fill the replay buffer
+            last_seq = data.get('last_message_seq')
+            if session.acknowledge(last_seq, data.get('last_chunk_id'), request_id) is None:
+                await reply({
+                    'type': 'error',
+                    'code': 'unknown_chunk',
+                    'message': f'Chunk {data.get("last_chunk_id")} is not buffered; acknowledge with last_message_seq'
+                })
+
+        elif message_type in ('cancel', 'interrupt'):
+            tasks = self._cancel_requests(session, request_id)
+            if tasks:
+                await asyncio.wait(tasks)
+            await reply({
+                'type': 'response_cancelled',
+                'cancelled': len(tasks)
+            })
+            logger.info(f"Client {id(websocket)} cancelled {len(tasks)} request(s)")
+
+        elif message_type == 'configure':
+            audio_transport = data.get('audio_transport', session.audio_transport)
+            frame_ms = data.get('frame_ms', session.frame_ms)
+            stream_audio = bool(data.get('stream_audio', session.stream_audio))
+            audio_format = data.get('audio_format', session.audio_format)
+            output_sample_rate = data.get('sample_rate', session.output_sample_rate)
+            if audio_transport not in AUDIO_TRANSPORTS:
+                await reply({
+                    'type': 'error',
+                    'message': f'Audio transport "{audio_transport}" not available'
+                })
+            elif (not isinstance(frame_ms, (int, float))
+                  or not STREAM_FRAME_MS_RANGE[0] <= frame_ms <= STREAM_FRAME_MS_RANGE[1]):
+                await reply({
+                    'type': 'error',
+                    'message': f'frame_ms must be between {STREAM_FRAME_MS_RANGE[0]} and {STREAM_FRAME_MS_RANGE[1]}'
+                })
+            elif audio_format is not None and audio_format not in AUDIO_ENCODERS:
+                await reply({
+                    'type': 'error',
+                    'message': f'Audio format "{audio_format}" not available'
+                })
+            elif stream_audio and audio_format is not None and not AUDIO_ENCODERS[audio_format].streamable:
+                await reply({
+                    'type': 'error',
+                    'message': f'Audio format "{audio_format}" cannot be streamed in frames'
+                })
+            elif output_sample_rate is not None and output_sample_rate not in OUTPUT_SAMPLE_RATES:
+                await reply({
+                    'type': 'error',
+                    'message': f'Sample rate {output_sample_rate} not available'
+                })
+            else:
+                session.audio_transport = audio_transport
+                session.stream_audio = stream_audio
+                session.frame_ms = frame_ms
+                session.audio_format = audio_format
+                session.output_sample_rate = output_sample_rate
+                if audio_format is None:
+                    audio_format = AUDIO_FRAME_FORMAT if audio_transport == 'binary' or stream_audio else 'wav'
+                await reply({
+                    'type': 'configured',
+                    'audio_transport': session.audio_transport,
+                    'stream_audio': session.stream_audio,
+                    'frame_ms': session.frame_ms,
+                    'audio_format': audio_format,
+                    'sample_rate': session.output_sample_rate or SynthesisService.sample_rate(session.model.engine)
+                })
+                logger.info(f"Client {id(websocket)} audio transport: {session.audio_transport}, "
+                            f"format: {audio_format}, streaming: {session.stream_audio}")
+
+        elif message_type == 'change_model':
+            model = str(data.get('model', ''))
+            choice, info = ModelRegistry.resolve(model)
+            if info is None:
+                await reply({
+                    'type': 'error',
+                    'message': f'Model "{model}" not available'
+                })
+            else:
+                # Loading can take a while, so other messages are answered meanwhile
+                session.model_task = asyncio.create_task(self._change_model(session, choice, reply))
 
-                # Get AI response and stream it
-                await self.stream_ollama_response(user_text, websocket)
+        elif message_type == 'get_models':
+            await reply({
+                'type': 'models_list',
+                'models': {choice: info['name'] for choice, info in COMPATIBLE_MODELS.items()},
+                'current_model': session.model.choice,
+                **self.models.stats()
+            })
 
         elif message_type == 'change_speaker':
             speaker_name = data.get('speaker', '')
-            if hasattr(self.tts, 'speakers') and speaker_name in self.tts.speakers:
-                self.speaker = speaker_name
-                await websocket.send(json.dumps({
+            if speaker_name in session.model.speakers:
+                session.speaker = speaker_name
+                await reply({
                     'type': 'speaker_changed',
-                    'speaker': self.speaker
-                }))
-                logger.info(f"Speaker changed to: {self.speaker}")
+                    'speaker': session.speaker
+                })
+                logger.info(f"Client {id(websocket)} speaker changed to: {session.speaker}")
             else:
-                await websocket.send(json.dumps({
+                await reply({
                     'type': 'error',
                     'message': f'Speaker "{speaker_name}" not available'
-                }))
+                })
 
         elif message_type == 'get_speakers':
-            speakers = getattr(self.tts, 'speakers', []) if hasattr(self.tts, 'speakers') else []
-            await websocket.send(json.dumps({
+            await reply({
                 'type': 'speakers_list',
-                'speakers': speakers,
-                'current_speaker': self.speaker
-            }))
+                'speakers': session.model.speakers,
+                'current_speaker': session.speaker
+            })
+
+        elif message_type == 'get_stats':
+            await reply({
+                'type': 'stats',
+                'metrics_enabled': self.metrics.enabled,
+                'stages': self.metrics.summary(),
+                'models': self.models.stats(),
+                'cache': self.synthesis_cache.stats() if self.synthesis_cache is not None else None,
+                'frontend': self.frontend.stats() if self.frontend is not None else None,
+                'clients': len(self.connected_clients),
+                'cluster': self._cluster_summary()
+            })
+
+        elif message_type == 'get_status':
+            await reply({
+                'type': 'status',
+                'ready': self.ready,
+                'startup': {name: round(seconds, 3) for name, seconds in self.startup_timings.items()},
+                'clients': len(self.connected_clients)
+            })
 
         elif message_type == 'ping':
-            await websocket.send(json.dumps({
+            await reply({
                 'type': 'pong',
                 'timestamp': data.get('timestamp', '')
-            }))
+            })
 
         else:
-            await websocket.send(json.dumps({
+            await reply({
                 'type': 'error',
                 'message': f'Unknown message type: {message_type}'
-            }))
+            })
+
+    def process_http_request(self, connection, request):
+        """Answer plain HTTP readiness probes on the WebSocket port"""
+        if request.path == '/ready':
+            if self.ready:
+                return connection.respond(HTTPStatus.OK, "ready\n")
+            return connection.respond(HTTPStatus.SERVICE_UNAVAILABLE, "not ready\n")
+        if request.path == '/metrics':
+            if not self.metrics.enabled:
+                return connection.respond(HTTPStatus.NOT_FOUND, "metrics disabled\n")
+            if self.cluster_stats is not None:
+                # Pre-fork workers share the port, so any of them may be scraped: report the whole cluster
+                gauges = self.metric_gauges()
+                cluster = {name: (gauges[name][0], value) for name, value in self.cluster_stats['gauges'].items()
+                           if name in gauges}
+                cluster['workers'] = ("Pre-fork server workers reporting", self.cluster_stats['workers'])
+                text = StageMetrics.merged([self.cluster_stats['metrics']]).prometheus(cluster)
+            else:
+                text = self.metrics.prometheus(self.metric_gauges())
+            response = connection.respond(HTTPStatus.OK, text)
+            del response.headers['Content-Type']  # Headers keeps every value set for a name
+            response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+            return response
+        return None
+
+    def metric_gauges(self):
+        """Point-in-time values exported next to the stage histograms"""
+        models = self.models.stats()
+        return {
+            'connected_clients': ("WebSocket clients connected", len(self.connected_clients)),
+            'synthesis_queue_depth': ("Sentences waiting for synthesis",
+                                      sum(loaded.synthesis.jobs.qsize() for loaded in list(self.models.models.values()))),
+            'models_loaded': ("TTS models resident", len(models['loaded'])),
+            'models_resident_bytes': ("Memory held by resident TTS models", self.models.resident_bytes()),
+            'ready': ("1 once the server accepts traffic", int(self.ready))
+        }
+
+    def _cluster_summary(self):
+        if self.cluster_stats is None:
+            return None
+        return {
+            'workers': self.cluster_stats['workers'],
+            'gauges': self.cluster_stats['gauges'],
+            'stages': StageMetrics.merged([self.cluster_stats['metrics']]).summary()
+        }
+
+    async def _report_to_supervisor(self, channel, stop, interval):
+        """Send this worker's stats to the pre-fork supervisor and keep the merged cluster stats it returns"""
+        reader, writer = await asyncio.open_connection(sock=channel)
+
+        async def receive():
+            async for line in reader:
+                try:
+                    self.cluster_stats = json.loads(line)
+                except ValueError:
+                    continue  # A partially sent update; the next one replaces it
+            if not stop.done():
+                logger.warning("Supervisor went away; shutting down")
+                stop.set_result(None)
+
+        receiver = asyncio.create_task(receive())
+        try:
+            while True:
+                writer.write(json.dumps({
+                    'pid': os.getpid(),
+                    'ready': self.ready,
+                    'metrics': self.metrics.export(),
+                    'gauges': {name: value for name, (_, value) in self.metric_gauges().items()}
+                }).encode() + b"\n")
+                await writer.drain()
+                await asyncio.sleep(interval)
+        finally:
+            receiver.cancel()
+            writer.close()
 
-    async def start_server(self, host="localhost", port=8765):
-        """Start the WebSocket server"""
+    async def start_server(self, host="localhost", port=8765, sock=None, channel=None, stats_interval=5.0):
+        """Start the WebSocket server
+
+        Pre-fork workers pass their SO_REUSEPORT listening socket as sock and
+        their pipe to the supervisor as channel. SIGTERM stops accepting new
+        connections and gives open ones drain_seconds to finish.
+        """
         logger.info(f"Starting WebSocket TTS Assistant server on {host}:{port}")
         logger.info(f"TTS Model: {COMPATIBLE_MODELS[self.model_choice]['name']}")
         logger.info(f"Speaker: {self.speaker or 'Default'}")
 
-        # Check if port is already in use
-        try:
-            import socket
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                if s.connect_ex((host, port)) == 0:
-                     logger.error(f"Port {port} is already in use")
-                     return
-        except Exception as e:
-            logger.warning(f"Could not check port status: {e}")
+        # Check if port is already in use (pre-fork workers share it on purpose)
+        if sock is None:
+            try:
+                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                    if s.connect_ex((host, port)) == 0:
+                         logger.error(f"Port {port} is already in use")
+                         return
+            except Exception as e:
+                logger.warning(f"Could not check port status: {e}")
 
+        loop = asyncio.get_running_loop()
+        stop = loop.create_future()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, lambda: stop.done() or stop.set_result(None))
+        except (NotImplementedError, RuntimeError):
+            pass  # Not on the main thread or not supported on this platform
 
+        reporter = None
         try:
-            async with websockets.serve(self.handle_client, host, port):
+            if sock is not None:
+                server = await websockets.serve(self.handle_client, sock=sock,
+                                                process_request=self.process_http_request)
+            else:
+                server = await websockets.serve(self.handle_client, host, port,
+                                                process_request=self.process_http_request)
+            try:
+                self.ready = True
+                self.startup_timings['total_seconds'] = time.perf_counter() - _import_started
                 logger.info("WebSocket server started successfully!")
-                logger.info(f"Connect your frontend to: ws://{host}:{port}")
-                await asyncio.Future()  # Run forever
+                logger.info("Startup timings: " + ", ".join(
+                    f"{name.replace('_seconds', '')} {seconds:.2f}s" for name, seconds in self.startup_timings.items()
+                ))
+                logger.info(f"Connect your frontend to: ws://{host}:{port} (readiness: http://{host}:{port}/ready)")
+                if channel is not None:
+                    reporter = asyncio.create_task(self._report_to_supervisor(channel, stop, stats_interval))
+                await stop  # Run until SIGTERM
+
+                # Stop accepting, then let open conversations finish
+                self.ready = False
+                logger.info(f"Draining {len(self.connected_clients)} connection(s)...")
+                server.close(close_connections=False)
+                try:
+                    await asyncio.wait_for(server.wait_closed(), self.drain_seconds)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Closing {len(self.connected_clients)} connection(s) still open after "
+                                   f"{self.drain_seconds:g}s")
+            finally:
+                server.close()
+                await server.wait_closed()
 
         except Exception as e:
             logger.error(f"Failed to start server: {e}")
             raise
+        finally:
+            self.ready = False
+            if reporter is not None:
+                reporter.cancel()
+            await self.llm_backend.close()
+            self.models.shutdown()
+            if self.frontend is not None:
+                self.frontend.save()
+
+
+def reuseport_socket(host, port):
+    """Listening socket that other processes can bind to the same port (kernel load-balanced)"""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(socket.SOMAXCONN)
+    sock.setblocking(False)
+    return sock
+
+
+class PreforkWorker:
+    """Supervisor-side record of one forked server process"""
+    def __init__(self, slot, pid, channel):
+        self.slot = slot
+        self.pid = pid
+        self.channel = channel
+        self.buffer = b""
+        self.stats = None
+        self.ready = False
+        self.retiring = False
+
+
+class PreforkSupervisor:
+    """Runs the server in several forked processes that share one port
+
+    The supervisor loads and warms the models once, stops the inference
+    threads (threads don't survive fork()), freezes the heap so the garbage
+    collector doesn't dirty the shared pages, then forks the workers. The
+    model weights are shared copy-on-write. Each worker binds its own
+    SO_REUSEPORT socket, so the kernel spreads connections between them,
+    and reports its stats over a socketpair. The supervisor merges the stats
+    and sends the cluster totals back, so /metrics and get_stats on any
+    worker cover all of them. Per-process gauges (clients, queue depth) are
+    summed; the models are the shared copy, so they are counted once.
+
+    Workers that die are replaced. SIGHUP replaces them one at a time,
+    starting each replacement and waiting for it to be ready before draining
+    the worker it replaces. SIGTERM/SIGINT drain and stop all of them.
+    """
+    # Gauges that add up across workers; the rest (models_loaded,
+    # models_resident_bytes, ready) describe the shared models and take the largest
+    SUMMED_GAUGES = ('connected_clients', 'synthesis_queue_depth')
+
+    def __init__(self, assistant, host, port, workers, stats_interval=5.0, ready_timeout=60.0):
+        self.assistant = assistant
+        self.host = host
+        self.port = port
+        self.size = max(1, workers)
+        self.stats_interval = stats_interval
+        self.ready_timeout = ready_timeout
+        self.workers = {}  # pid -> PreforkWorker
+        self.selector = selectors.DefaultSelector()
+        self.stopping = False
+        self.restart_requested = False
+        self.retire_queue = []  # Workers still to replace in a rolling restart
+        self.replacing = None  # (old worker, new worker, started) during a rolling restart
+
+    def run(self):
+        """Fork the workers and supervise them until SIGTERM/SIGINT"""
+        self.assistant.models.stop_services()
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, 'restart_requested', True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, 'stopping', True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, 'stopping', True))
+
+        for slot in range(self.size):
+            self._spawn(slot)
+        logger.info(f"Pre-fork supervisor {os.getpid()} started {self.size} worker(s) on {self.host}:{self.port}")
+
+        last_broadcast = time.monotonic()
+        while self.workers:
+            for key, _ in self.selector.select(timeout=0.5):
+                self._read(key.data)
+            self._reap()
+
+            if self.stopping:
+                for worker in list(self.workers.values()):
+                    if not worker.retiring:
+                        self._retire(worker)
+            elif self.restart_requested:
+                self.restart_requested = False
+                self.retire_queue = [worker for worker in self.workers.values() if not worker.retiring]
+                logger.info(f"Rolling restart of {len(self.retire_queue)} worker(s)")
+            if not self.stopping:
+                self._continue_restart()
+
+            if time.monotonic() - last_broadcast >= self.stats_interval:
+                last_broadcast = time.monotonic()
+                self._broadcast()
+        logger.info("Pre-fork supervisor stopped")
+
+    def _spawn(self, slot):
+        parent_channel, child_channel = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            # Worker: drop the supervisor's state, restart inference threads and serve
+            parent_channel.close()
+            self.selector.close()
+            for worker in self.workers.values():
+                worker.channel.close()
+            signal.signal(signal.SIGHUP, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C reaches the supervisor, which drains us
+            code = 0
+            try:
+                self.assistant.models.start_services()
+                sock = reuseport_socket(self.host, self.port)
+                asyncio.run(self.assistant.start_server(self.host, self.port, sock=sock, channel=child_channel,
+                                                        stats_interval=self.stats_interval))
+            except BaseException as e:
+                logger.error(f"Worker {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+
+        child_channel.close()
+        parent_channel.setblocking(False)
+        worker = PreforkWorker(slot, pid, parent_channel)
+        self.workers[pid] = worker
+        self.selector.register(parent_channel, selectors.EVENT_READ, worker)
+        logger.info(f"Started worker {slot} (pid {pid})")
+        return worker
+
+    def _read(self, worker):
+        try:
+            data = worker.channel.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.selector.unregister(worker.channel)
+            return
+        worker.buffer += data
+        *lines, worker.buffer = worker.buffer.split(b"\n")
+        for line in lines:
+            worker.stats = json.loads(line)
+            if worker.stats.get('ready') and not worker.ready:
+                worker.ready = True
+                logger.info(f"Worker {worker.slot} (pid {worker.pid}) is ready")
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            try:
+                self.selector.unregister(worker.channel)
+            except (KeyError, ValueError):
+                pass
+            worker.channel.close()
 
-def main():
-    """Main function to start the WebSocket server"""
-    print("WebSocket Text-to-Audio AI Assistant")
-    print("=" * 50)
+            if worker.retiring or self.stopping:
+                logger.info(f"Worker {worker.slot} (pid {pid}) exited")
+            else:
+                logger.warning(f"Worker {worker.slot} (pid {pid}) died with status {status}; restarting it")
+                time.sleep(1)  # Don't spin if workers crash straight away
+                self._spawn(worker.slot)
 
+    def _retire(self, worker):
+        """Ask a worker to drain and exit"""
+        worker.retiring = True
+        try:
+            os.kill(worker.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _continue_restart(self):
+        """Advance a rolling restart by at most one worker"""
+        if self.replacing is not None:
+            old, new, started = self.replacing
+            if new.pid not in self.workers:
+                self.replacing = None  # The replacement died; _reap started another for its slot
+            elif new.ready or time.monotonic() - started > self.ready_timeout:
+                self._retire(old)
+                self.replacing = None
+            return
+
+        while self.retire_queue:
+            old = self.retire_queue.pop(0)
+            if old.pid in self.workers and not old.retiring:
+                self.replacing = (old, self._spawn(old.slot), time.monotonic())
+                return
+
+    def _broadcast(self):
+        """Merge every worker's latest stats and send the cluster's back to all of them"""
+        reports = [worker.stats for worker in self.workers.values() if worker.stats]
+        if not reports:
+            return
+        gauges = {}
+        for report in reports:
+            for name, value in report['gauges'].items():
+                if name in self.SUMMED_GAUGES:
+                    gauges[name] = gauges.get(name, 0) + value
+                else:
+                    gauges[name] = max(gauges.get(name, value), value)
+        merged = {
+            'workers': len(reports),
+            'gauges': gauges,
+            'metrics': StageMetrics.merged(report['metrics'] for report in reports).export()
+        }
+        line = json.dumps(merged).encode() + b"\n"
+        for worker in self.workers.values():
+            try:
+                worker.channel.sendall(line)
+            except (BlockingIOError, OSError):
+                pass  # A busy or exiting worker misses one update
+
+def env_int(name, default=None):
+    """Read an integer setting from the environment"""
+    value = os.environ.get(name, "").strip()
+    return int(value) if value else default
+
+
+def parse_args(argv=None):
+    """Parse server settings from the command line, falling back to environment variables"""
+    parser = argparse.ArgumentParser(description="WebSocket Text-to-Audio AI Assistant")
+    parser.add_argument("--model", default=os.environ.get("TTS_MODEL", "1"),
+                        help="TTS model to start with: a key from the model list or a model name (env TTS_MODEL)")
+    parser.add_argument("--host", default=os.environ.get("HOST", "localhost"),
+                        help="interface to listen on (env HOST)")
+    parser.add_argument("--port", type=int, default=env_int("PORT", 8765),
+                        help="port to listen on (env PORT)")
+    parser.add_argument("--interactive", action="store_true",
+                        help="prompt for the model, host and port instead of reading them from flags")
+    parser.add_argument("--warmup-text", default=os.environ.get("TTS_WARMUP_TEXT", DEFAULT_WARMUP_TEXT),
+                        help="sentence synthesized by each model before it serves requests; "
+                             "empty disables warm-up (env TTS_WARMUP_TEXT)")
+    parser.add_argument("--tts-workers", type=int, default=env_int("TTS_WORKERS", 1),
+                        help="number of TTS inference workers; in thread mode more than one needs "
+                             "--replicate-models (env TTS_WORKERS)")
+    parser.add_argument("--replicate-models", action="store_true",
+                        default=os.environ.get("TTS_REPLICATE_MODELS", "0") == "1",
+                        help="in thread mode, load a model copy per worker so they synthesize in parallel "
+                             "(memory grows with --tts-workers; env TTS_REPLICATE_MODELS=1)")
+    parser.add_argument("--inference-mode", choices=SynthesisService.MODES,
+                        default=os.environ.get("TTS_INFERENCE_MODE", "thread"),
+                        help="run inference in threads or in worker processes (env TTS_INFERENCE_MODE)")
+    parser.add_argument("--torch-threads", type=int, default=env_int("TTS_TORCH_THREADS"),
+                        help="torch threads per inference process, default cores / workers (env TTS_TORCH_THREADS)")
+    parser.add_argument("--batch-window-ms", type=float, default=float(os.environ.get("TTS_BATCH_WINDOW_MS", 0)),
+                        help="collect sentences across sessions for this long before a batched forward pass "
+                             "(non-autoregressive models such as FastPitch); 0 disables batching "
+                             "(env TTS_BATCH_WINDOW_MS)")
+    parser.add_argument("--max-batch-size", type=int, default=env_int("TTS_MAX_BATCH_SIZE", 8),
+                        help="largest synthesis batch (env TTS_MAX_BATCH_SIZE)")
+    parser.add_argument("--session-inflight-limit", type=int, default=env_int("TTS_SESSION_INFLIGHT_LIMIT", 1),
+                        help="sentences one session may have synthesizing at once while others wait "
+                             "(env TTS_SESSION_INFLIGHT_LIMIT)")
+    parser.add_argument("--max-pending-chunks", type=int, default=env_int("TTS_MAX_PENDING_CHUNKS", 4),
+                        help="chunks a response may have waiting for synthesis or delivery before the LLM "
+                             "stream is paused (env TTS_MAX_PENDING_CHUNKS)")
+    parser.add_argument("--max-concurrent-requests", type=int, default=env_int("MAX_CONCURRENT_REQUESTS", 4),
+                        help="requests one connection may have running at once (env MAX_CONCURRENT_REQUESTS)")
+    parser.add_argument("--audio-postprocess", action=argparse.BooleanOptionalAction,
+                        default=os.environ.get("TTS_POSTPROCESS", "1") != "0",
+                        help="trim silence and level loudness of each chunk (env TTS_POSTPROCESS=0 disables)")
+    parser.add_argument("--target-dbfs", type=float, default=float(os.environ.get("TTS_TARGET_DBFS", -20.0)),
+                        help="speech loudness chunks are leveled to (env TTS_TARGET_DBFS)")
+    parser.add_argument("--cpu-optimize", action="store_true",
+                        default=os.environ.get("TTS_CPU_OPTIMIZE", "0") == "1",
+                        help="run inference under torch.inference_mode with tuned thread counts (env TTS_CPU_OPTIMIZE=1)")
+    parser.add_argument("--intra-op-threads", type=int, default=env_int("TTS_INTRA_OP_THREADS"),
+                        help="torch intra-op threads in --cpu-optimize mode (env TTS_INTRA_OP_THREADS)")
+    parser.add_argument("--inter-op-threads", type=int, default=env_int("TTS_INTER_OP_THREADS", 1),
+                        help="torch inter-op threads in --cpu-optimize mode (env TTS_INTER_OP_THREADS)")
+    parser.add_argument("--quantize", action="store_true", default=os.environ.get("TTS_QUANTIZE", "0") == "1",
+                        help="with --cpu-optimize, apply dynamic int8 quantization when the output stays close "
+                             "to fp32 (env TTS_QUANTIZE=1)")
+    parser.add_argument("--metrics", action=argparse.BooleanOptionalAction,
+                        default=os.environ.get("TTS_METRICS", "1") != "0",
+                        help="record per-stage latency histograms for /metrics and get_stats "
+                             "(env TTS_METRICS=0 disables)")
+    parser.add_argument("--server-workers", type=int, default=env_int("SERVER_WORKERS", 1),
+                        help="pre-fork this many server processes sharing the port through SO_REUSEPORT; "
+                             "SIGHUP restarts them one at a time (env SERVER_WORKERS)")
+    parser.add_argument("--drain-seconds", type=float, default=float(os.environ.get("DRAIN_SECONDS", 30)),
+                        help="how long a stopping server lets open conversations finish (env DRAIN_SECONDS)")
+    parser.add_argument("--session-ttl", type=float, default=float(os.environ.get("SESSION_TTL", 120)),
+                        help="seconds a disconnected session keeps generating and can be resumed; "
+                             "0 ends it at once (env SESSION_TTL)")
+    parser.add_argument("--replay-messages", type=int, default=env_int("REPLAY_MESSAGES", 256),
+                        help="recent messages kept per session for replay on resume (env REPLAY_MESSAGES)")
+    parser.add_argument("--replay-mb", type=int, default=env_int("REPLAY_MB", 8),
+                        help="most memory one session's replay buffer may hold; clients free it sooner "
+                             "by acknowledging what they received (env REPLAY_MB)")
+    parser.add_argument("--frontend-cache", type=int, default=env_int("TTS_FRONTEND_CACHE", 20000),
+                        help="sentences whose cleaned/phonemized tokens are memoized; 0 disables "
+                             "(env TTS_FRONTEND_CACHE)")
+    parser.add_argument("--frontend-word-cache", type=int, default=env_int("TTS_FRONTEND_WORD_CACHE", 0),
+                        help="also memoize this many words' phonemes to phonemize new sentences from known words; "
+                             "can miss context-dependent pronunciations, 0 disables (env TTS_FRONTEND_WORD_CACHE)")
+    parser.add_argument("--frontend-cache-file", default=os.environ.get("TTS_FRONTEND_CACHE_FILE"),
+                        help="load the front-end cache from and save it to this JSON file "
+                             "(env TTS_FRONTEND_CACHE_FILE)")
+    parser.add_argument("--frontend-vocab", default=os.environ.get("TTS_FRONTEND_VOCAB"),
+                        help="words or phrases, one per line, run through the front-end as each model loads "
+                             "(env TTS_FRONTEND_VOCAB)")
+    parser.add_argument("--model-memory-mb", type=int, default=env_int("TTS_MODEL_MEMORY_MB", 0),
+                        help="memory budget for loaded models; least recently used idle models are unloaded "
+                             "beyond it, 0 keeps every model (env TTS_MODEL_MEMORY_MB)")
+    return parser.parse_args(argv)
+
+
+def prompt_settings(args):
+    """Ask for the model, host and port on the terminal (--interactive)"""
     # Let user select TTS model
     print("Available TTS models:")
     for key, model_info in COMPATIBLE_MODELS.items():
         print(f"{key}. {model_info['name']}")
 
-    choice = input("\nSelect model (1-4, Enter for default 1): ").strip() or "1"
+    args.model = input(f"\nSelect model (1-4, Enter for default {args.model}): ").strip() or args.model
+    args.host = input(f"Host (Enter for {args.host}): ").strip() or args.host
+    port_str = input(f"Port (Enter for {args.port}): ").strip() or str(args.port)
 
     try:
-        # Create assistant instance
-        assistant = WebSocketTextToAudioAssistant(model_choice=choice)
+        args.port = int(port_str)
+    except ValueError:
+        print(f"Invalid port number, using default {args.port}.")
+
+
+def read_manifest(path):
+    """Yield (output name, text, speaker, language) for each entry of a batch manifest
+
+    A .jsonl manifest has one {"text": ..., "output": ..., "speaker": ...,
+    "language": ...} object per line (only text is required); any other file is
+    read as one text per line. Entries without an output are numbered by line.
+    """
+    jsonl = path.endswith('.jsonl')
+    with open(path, encoding='utf-8') as manifest:
+        for line_number, line in enumerate(manifest, 1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line) if jsonl else {'text': line}
+            output = str(entry.get('output') or entry.get('id') or f"{line_number:06d}")
+            if not output.endswith('.wav'):
+                output += '.wav'
+            yield output, str(entry.get('text') or ''), entry.get('speaker'), entry.get('language')
+
+
+def run_batch(args):
+    """Synthesize a manifest into WAV files across inference processes
+
+    Each entry is split into sentences that are synthesized in parallel and
+    appended, in order, to a temporary WAV that is renamed into place when
+    complete, so an interrupted run can be resumed and existing outputs are
+    skipped. Only a bounded window of sentences is in flight at once. An
+    entry whose synthesis fails is reported, its temporary WAV removed, and
+    the run goes on; the number of failed entries is returned.
+    """
+    choice, info = ModelRegistry.resolve(args.model)
+    language = args.language or info['language']
+    os.makedirs(args.output_dir, exist_ok=True)
+    total = sum(1 for _ in read_manifest(args.manifest))
+
+    optimizer = None
+    if args.cpu_optimize:
+        optimizer = CPUInferenceOptimizer(inter_op_threads=1, quantize=args.quantize)
+
+    context = multiprocessing.get_context('spawn')
+    workers = max(1, args.workers)
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // workers)
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_process_worker_init,
+        initargs=(info['model'], torch_threads, context.Value('i', 0), context.Value('i', 0), optimizer)
+    )
+    print(f"Batch synthesis of {total} entries with {info['name']} on {workers} process(es) "
+          f"into {args.output_dir}")
+
+    window = []  # (entry, future, last sentence of the entry), in submission order
+    writers = {}  # output path -> open wave writer
+    failed_paths = set()  # entries with a failed sentence whose later sentences are dropped
+    done = skipped = empty = failed = 0
+    audio_seconds = 0.0
+    started = last_report = time.perf_counter()
+
+    def release(future):
+        # Free the shared memory of a finished sentence that won't be written
+        if future.done() and not future.cancelled() and future.exception() is None:
+            name, size, _ = future.result()
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            except FileNotFoundError:
+                return
+            shm.close()
+            shm.unlink()
+
+    def write_oldest():
+        nonlocal done, failed, audio_seconds
+        (path, tmp_path), future, last = window.pop(0)
+        if path in failed_paths:
+            future.exception()  # Wait for the sentence so its memory can be freed
+            release(future)
+            if last:
+                failed_paths.discard(path)
+            return
+        try:
+            name, size, sample_rate = future.result()
+        except Exception as e:
+            print(f"{os.path.relpath(path, args.output_dir)}: synthesis failed: {e}", file=sys.stderr)
+            failed += 1
+            writer = writers.pop(path, None)
+            if writer is not None:
+                writer.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if not last:
+                failed_paths.add(path)
+            return
+        audio = _read_shared_audio(name, size)
+        writer = writers.get(path)
+        if writer is None:
+            writer = writers[path] = wave.open(tmp_path, 'wb')
+            writer.setnchannels(1)
+            writer.setsampwidth(2)
+            writer.setframerate(sample_rate)
+        writer.writeframes(audio.astype('<i2', copy=False).tobytes())
+        audio_seconds += size / sample_rate
+        if last:
+            writers.pop(path).close()
+            os.replace(tmp_path, path)
+            done += 1
+
+    def report(final=False):
+        elapsed = time.perf_counter() - started
+        print(f"{done + skipped + empty + failed}/{total} entries ({skipped} skipped, {empty} empty, {failed} failed), "
+              f"{audio_seconds:.1f}s of audio in "
+              f"{elapsed:.1f}s ({audio_seconds / elapsed if elapsed else 0:.2f}x real time, "
+              f"{done / elapsed if elapsed else 0:.2f} entries/s)" + ("" if final else "..."), flush=True)
+
+    try:
+        for output, text, speaker, entry_language in read_manifest(args.manifest):
+            path = os.path.join(args.output_dir, output)
+            if os.path.exists(path):
+                skipped += 1
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
 
-        # Start server
-        host = input("Host (Enter for localhost): ").strip() or "localhost"
-        port_str = input("Port (Enter for 8765): ").strip() or "8765"
+            segmenter = SentenceSegmenter(first_min_chars=40, first_max_chars=200)
+            sentences = segmenter.feed(text) + segmenter.flush()
+            if not sentences:
+                print(f"{output}: no text to synthesize", file=sys.stderr)
+                empty += 1
+                continue
+            for index, sentence in enumerate(sentences):
+                future = pool.submit(_process_worker_synthesize, sentence, speaker or args.speaker,
+                                     entry_language or language)
+                window.append(((path, path + '.tmp'), future, index == len(sentences) - 1))
+                while len(window) > workers * 2:
+                    write_oldest()
+
+            if time.perf_counter() - last_report >= args.progress_seconds:
+                last_report = time.perf_counter()
+                report()
+
+        while window:
+            write_oldest()
+        report(final=True)
+        return failed
+    finally:
+        for writer in writers.values():
+            writer.close()  # Partial output stays in its .tmp file and is redone next run
+        pool.shutdown(wait=True, cancel_futures=True)
+        for _, future, _ in window:
+            release(future)  # Finished but never written (the run was interrupted)
+
+
+def parse_batch_args(argv=None):
+    """Parse settings for the offline batch synthesis command"""
+    parser = argparse.ArgumentParser(prog="app.py batch", description="Synthesize a manifest of texts to WAV files")
+    parser.add_argument("manifest", help="a .jsonl file of {\"text\", \"output\", \"speaker\", \"language\"} "
+                                         "objects, or a text file with one text per line")
+    parser.add_argument("--output-dir", default="output", help="directory for the WAV files")
+    parser.add_argument("--model", default=os.environ.get("TTS_MODEL", "1"),
+                        help="a key from the model list or a model name (env TTS_MODEL)")
+    parser.add_argument("--workers", type=int, default=env_int("TTS_WORKERS", max(1, (os.cpu_count() or 2) // 2)),
+                        help="inference processes (env TTS_WORKERS)")
+    parser.add_argument("--torch-threads", type=int, default=env_int("TTS_TORCH_THREADS"),
+                        help="torch threads per process, default cores / workers (env TTS_TORCH_THREADS)")
+    parser.add_argument("--speaker", help="speaker for entries that don't name one")
+    parser.add_argument("--language", help="language for entries that don't name one (default: the model's)")
+    parser.add_argument("--cpu-optimize", action="store_true", help="see the server's --cpu-optimize")
+    parser.add_argument("--quantize", action="store_true", help="see the server's --quantize")
+    parser.add_argument("--progress-seconds", type=float, default=5.0, help="how often to print progress")
+    args = parser.parse_args(argv)
+    if ModelRegistry.resolve(args.model)[0] is None:
+        parser.error(f"unknown model {args.model!r}; choose one of: {', '.join(COMPATIBLE_MODELS)}")
+    return args
 
-        try:
-            port = int(port_str)
-        except ValueError:
-            print("Invalid port number, using default 8765.")
-            port = 8765
+
+def main():
+    """Main function to start the WebSocket server"""
+    if sys.argv[1:2] == ["batch"]:
+        if run_batch(parse_batch_args(sys.argv[2:])):
+            sys.exit(1)
+        return
+
+    args = parse_args()
+
+    print("WebSocket Text-to-Audio AI Assistant")
+    print("=" * 50)
+
+    if args.interactive:
+        prompt_settings(args)
+
+    choice, _ = ModelRegistry.resolve(args.model)
+    if choice is None:
+        print(f"Unknown model {args.model!r}; choose one of: {', '.join(COMPATIBLE_MODELS)}")
+        sys.exit(2)
+    if args.server_workers > 1 and args.inference_mode == 'process':
+        print("--server-workers needs --inference-mode thread (inference processes can't be forked)")
+        sys.exit(2)
+
+    optimizer = None
+    if args.cpu_optimize:
+        optimizer = CPUInferenceOptimizer(
+            intra_op_threads=args.intra_op_threads,
+            inter_op_threads=args.inter_op_threads,
+            quantize=args.quantize
+        )
+
+    frontend = None
+    if args.frontend_cache > 0:
+        frontend = TextFrontendCache(
+            max_phrases=args.frontend_cache,
+            max_words=args.frontend_word_cache,
+            path=args.frontend_cache_file,
+            vocabulary_path=args.frontend_vocab
+        )
+
+    try:
+        # Create assistant instance
+        assistant = WebSocketTextToAudioAssistant(
+            model_choice=choice,
+            tts_workers=args.tts_workers,
+            replicate_models=args.replicate_models,
+            inference_mode=args.inference_mode,
+            torch_threads=args.torch_threads,
+            batch_window_ms=args.batch_window_ms,
+            max_batch_size=args.max_batch_size,
+            session_inflight_limit=args.session_inflight_limit,
+            max_pending_chunks=args.max_pending_chunks,
+            max_concurrent_requests=args.max_concurrent_requests,
+            postprocess=args.audio_postprocess,
+            target_dbfs=args.target_dbfs,
+            model_memory_bytes=args.model_memory_mb * 1024 * 1024,
+            warmup_text=args.warmup_text,
+            optimizer=optimizer,
+            metrics=args.metrics,
+            session_ttl=args.session_ttl,
+            replay_messages=args.replay_messages,
+            replay_bytes=args.replay_mb * 1024 * 1024,
+            frontend=frontend
+        )
+        assistant.drain_seconds = args.drain_seconds
+        host, port = args.host, args.port
 
         print(f"\nStarting server...")
         print(f"Frontend should connect to: ws://{host}:{port}")
@@ -540,7 +3945,10 @@ def main():
         print("=" * 50)
 
         # Run the server
-        asyncio.run(assistant.start_server(host, port))
+        if args.server_workers > 1:
+            PreforkSupervisor(assistant, host, port, args.server_workers).run()
+        else:
+            asyncio.run(assistant.start_server(host, port))
 
     except KeyboardInterrupt:
         print("\nServer stopped by user")
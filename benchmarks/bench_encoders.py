@@ -0,0 +1,71 @@
+"""Benchmark audio encoders: encode cost against bytes on the wire
+
+Encodes a synthetic speech-like signal with every available encoder at the
+model's native rate and at each requested output rate, reporting encode
+time per second of audio and payload size over the binary and JSON
+(base64) transports.
+
+    python benchmarks/bench_encoders.py --rates 16000 8000
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import AUDIO_ENCODERS, resample_audio
+
+
+def speech_like_signal(seconds, sample_rate, seed=0):
+    """Harmonic voice-like tone with a syllable-rate envelope and a little noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 25 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5
+    signal = 0.25 * voice * envelope + 0.005 * rng.standard_normal(len(t))
+    return np.clip(signal, -1, 1).astype(np.float32)
+
+
+def measure(encoder, audio, sample_rate, repeat):
+    """Seconds per encode (including resampling) and encoded size"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        payload = encoder.encode(audio, sample_rate)
+    return (time.perf_counter() - start) / repeat, len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5.0, help='length of the test signal')
+    parser.add_argument('--native-rate', type=int, default=22050, help='model output rate')
+    parser.add_argument('--rates', type=int, nargs='*', default=[16000, 8000], help='output rates to compare')
+    parser.add_argument('--repeat', type=int, default=20, help='encodes per measurement')
+    args = parser.parse_args()
+
+    native = speech_like_signal(args.seconds, args.native_rate)
+    print(f"{args.seconds:g} s of audio at {args.native_rate} Hz; encoders: {', '.join(AUDIO_ENCODERS)}")
+    print(f"{'format':<10} {'rate':>6} {'resample ms/s':>14} {'encode ms/s':>12} "
+          f"{'binary bytes':>13} {'JSON bytes':>11} {'kbit/s':>8}")
+
+    for rate in [args.native_rate] + [rate for rate in args.rates if rate != args.native_rate]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            audio = resample_audio(native, args.native_rate, rate)
+        resample_seconds = (time.perf_counter() - start) / args.repeat
+
+        for name, encoder in AUDIO_ENCODERS.items():
+            encode_seconds, size = measure(encoder, audio, rate, args.repeat)
+            json_size = len(base64.b64encode(b'\0' * size))
+            print(f"{name:<10} {rate:>6} {resample_seconds * 1000 / args.seconds:>14.2f} "
+                  f"{encode_seconds * 1000 / args.seconds:>12.2f} {size:>13} {json_size:>11} "
+                  f"{size * 8 / args.seconds / 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
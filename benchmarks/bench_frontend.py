@@ -0,0 +1,112 @@
+"""Benchmark the memoized text front-end (cleaning, number expansion, phonemization)
+
+Loads a model and times its tokenizer's text-to-token conversion per
+sentence, without the cache and then with TextFrontendCache applied:
+repeated sentences (phrase hits), and new sentences made of words already
+seen (word hits, phoneme models only, with the opt-in --words table). The
+share of a full tts() call the front-end takes is measured on a few
+sentences for context.
+
+    python benchmarks/bench_frontend.py --model 1 --sentences 200
+    python benchmarks/bench_frontend.py --model 2 --vocab vocab.txt --words 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import COMPATIBLE_MODELS, TextFrontendCache, load_tts
+
+SENTENCES = [
+    "Hello there, how can I help you today?",
+    "The weather tomorrow looks sunny with a light breeze from the west.",
+    "Please remember to bring your ticket and a valid form of identification.",
+    "That is a great question, and the answer depends on a few things.",
+    "Your order of 3 items will arrive on the 21st, at about 10:30 in the morning.",
+    "Sure, I can do that for you right away.",
+]
+
+
+def make_sentences(count, seed):
+    """Sentences recombined from the words of SENTENCES, so every word recurs"""
+    rng = random.Random(seed)
+    words = [word.strip(',.?') for sentence in SENTENCES for word in sentence.split()]
+    sentences = []
+    for _ in range(count):
+        length = rng.randint(5, 14)
+        sentence = ' '.join(rng.choice(words) for _ in range(length))
+        sentences.append(sentence[0].upper() + sentence[1:] + rng.choice('.?!'))
+    return sentences
+
+
+def convert_all(convert, sentences):
+    """Mean milliseconds per sentence to convert sentences to token ids"""
+    started = time.perf_counter()
+    for text in sentences:
+        convert(text)
+    return (time.perf_counter() - started) * 1000 / len(sentences)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='1', choices=list(COMPATIBLE_MODELS), help='COMPATIBLE_MODELS key')
+    parser.add_argument('--sentences', type=int, default=200, help='sentences per pass')
+    parser.add_argument('--vocab', help='vocabulary file to pre-populate the cache with')
+    parser.add_argument('--words', type=int, default=0, help='size of the opt-in word phoneme table')
+    parser.add_argument('--tts-sentences', type=int, default=3, help='full tts() calls used to estimate the share')
+    args = parser.parse_args()
+
+    engine = load_tts(COMPATIBLE_MODELS[args.model]['model'])
+    tokenizer = engine.synthesizer.tts_model.tokenizer
+    if hasattr(tokenizer, 'text_to_ids'):
+        def convert(text):
+            return tokenizer.text_to_ids(text)
+    else:
+        def convert(text):
+            return tokenizer.encode(text, lang='en')
+
+    seen = make_sentences(args.sentences, seed=0)
+    unseen = make_sentences(args.sentences, seed=1)
+    convert(seen[0])  # Load phonemizer backends before timing
+
+    uncached_ms = convert_all(convert, seen)
+
+    tts_ms = []
+    for text in SENTENCES[:args.tts_sentences]:
+        started = time.perf_counter()
+        if getattr(engine, 'speakers', None):
+            engine.tts(text=text, speaker=engine.speakers[0],
+                       language='en' if getattr(engine, 'is_multi_lingual', False) else None)
+        else:
+            engine.tts(text=text)
+        tts_ms.append((time.perf_counter() - started) * 1000)
+    share_ms = convert_all(convert, SENTENCES[:args.tts_sentences])
+
+    frontend = TextFrontendCache(max_words=args.words, vocabulary_path=args.vocab)
+    started = time.perf_counter()
+    frontend.apply(engine)
+    prepopulate_seconds = time.perf_counter() - started
+
+    rows = [
+        ('uncached', uncached_ms),
+        ('cached, first pass', convert_all(convert, seen)),
+        ('cached, repeated', convert_all(convert, seen)),
+        ('cached, new sentences', convert_all(convert, unseen)),
+    ]
+
+    print(f"{COMPATIBLE_MODELS[args.model]['name']}: {args.sentences} sentences per pass")
+    print(f"  front-end is {share_ms:.2f} ms of a {sum(tts_ms) / len(tts_ms):.0f} ms tts() call "
+          f"({share_ms / (sum(tts_ms) / len(tts_ms)):.1%})")
+    if args.vocab:
+        print(f"  pre-populated from {args.vocab} in {prepopulate_seconds:.2f}s")
+    print(f"  {'pass':<24} {'ms/sentence':>12} {'saved':>9}")
+    for label, ms in rows:
+        print(f"  {label:<24} {ms:>12.3f} {uncached_ms - ms:>+9.3f}")
+    print(f"  {frontend.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark TTS inference with and without the CPU optimization mode
+
+Each model/configuration pair runs in a fresh process, so model weights and
+peak RSS are not shared between runs. After one warm-up sentence, the test
+sentences are synthesized and the real-time factor (synthesis seconds per
+second of audio, lower is better) and the process's peak RSS are reported.
+
+    python benchmarks/bench_inference.py --models 1 2 --quantize --intra-op-threads 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import COMPATIBLE_MODELS, CPUInferenceOptimizer, SynthesisService, load_tts
+
+SENTENCES = [
+    "Hello there, how can I help you today?",
+    "The weather tomorrow looks sunny with a light breeze from the west.",
+    "Please remember to bring your ticket and a valid form of identification.",
+    "That is a great question, and the answer depends on a few things.",
+]
+
+
+def run_config(model, optimizer):
+    """Load a model (optionally optimized), returning RTF and peak RSS from this process"""
+    started = time.perf_counter()
+    engine = load_tts(COMPATIBLE_MODELS[model]['model'])
+    if optimizer is not None:
+        optimizer.apply(engine)
+    load_seconds = time.perf_counter() - started
+
+    speakers = getattr(engine, 'speakers', None)
+    language = 'en' if getattr(engine, 'is_multi_lingual', False) else None
+
+    def synthesize(text):
+        if speakers:
+            return engine.tts(text=text, speaker=speakers[0], language=language)
+        return engine.tts(text=text)
+
+    synthesize(SENTENCES[0])  # Warm-up
+
+    synthesis_seconds = audio_seconds = 0.0
+    sample_rate = SynthesisService.sample_rate(engine)
+    for text in SENTENCES:
+        started = time.perf_counter()
+        audio = synthesize(text)
+        synthesis_seconds += time.perf_counter() - started
+        audio_seconds += len(audio) / sample_rate
+
+    return {
+        'load_seconds': load_seconds,
+        'rtf': synthesis_seconds / audio_seconds,
+        'audio_seconds': audio_seconds,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', nargs='*', default=['1'], choices=list(COMPATIBLE_MODELS),
+                        help='COMPATIBLE_MODELS keys to benchmark')
+    parser.add_argument('--intra-op-threads', type=int, default=None, help='torch intra-op threads when optimized')
+    parser.add_argument('--inter-op-threads', type=int, default=1, help='torch inter-op threads when optimized')
+    parser.add_argument('--quantize', action='store_true', help='also run the int8 dynamic quantization mode')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    configs = [
+        ('fp32', None),
+        ('optimized', CPUInferenceOptimizer(args.intra_op_threads, args.inter_op_threads)),
+    ]
+    if args.quantize:
+        configs.append(('optimized+int8', CPUInferenceOptimizer(args.intra_op_threads, args.inter_op_threads,
+                                                                quantize=True)))
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    print(f"{'model':<40} {'mode':<15} {'load s':>7} {'RTF':>7} {'peak RSS MB':>12}")
+    for model in args.models:
+        for mode, optimizer in configs:
+            with context.Pool(1) as pool:
+                result = pool.apply(run_config, (model, optimizer))
+            result.update(model=model, mode=mode)
+            results.append(result)
+            print(f"{COMPATIBLE_MODELS[model]['name'][:40]:<40} {mode:<15} {result['load_seconds']:>7.2f} "
+                  f"{result['rtf']:>7.3f} {result['peak_rss_mb']:>12.0f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Microbenchmark for SentenceSegmenter
+
+Measures segmentation throughput and simulates time-to-first-audio for a
+token stream, comparing the incremental segmenter with the old line-based
+punctuation check.
+
+    python benchmarks/bench_segmenter.py --tokens-per-second 30
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import SentenceSegmenter
+
+SAMPLE_RESPONSE = (
+    "That's a great question! Dr. Patel's study found that roughly 3.5 percent of "
+    "participants, i.e. about one in thirty, reported symptoms within 2 weeks. "
+    "There are a few things to keep in mind here, and I'll go through them one at a time so "
+    "nothing gets lost along the way.\n"
+    "1. The sample was small, so the confidence interval is wide.\n"
+    "2. Most participants were recruited in the U.S. between Jan. and Mar. of 2021, "
+    "which may not generalize to other regions or seasons.\n"
+    "Overall the results are encouraging but far from conclusive, and a follow-up trial "
+    "with a larger and more diverse group of people would help settle the matter. "
+    "Would you like me to summarize the methodology, or talk about how it compares to "
+    "earlier research on the same topic?"
+)
+
+
+def tokenize(text):
+    """Split text into LLM-like deltas of up to four characters"""
+    return re.findall(r'\s*\S{1,4}', text)
+
+
+def legacy_chunks(tokens):
+    """The previous chunker: line-buffered stdout with a punctuation check per line"""
+    chunks = []
+    timestamps = []
+    line = ""
+    current_chunk = ""
+    for index, token in enumerate(tokens):
+        line += token
+        if "\n" not in line and index != len(tokens) - 1:
+            continue
+        for part in line.split("\n"):
+            part = part.strip()
+            if not part:
+                continue
+            current_chunk += part + " "
+            if any(punct in current_chunk for punct in ['. ', '! ', '? ', '\n']):
+                chunks.append(current_chunk.strip())
+                timestamps.append(index)
+                current_chunk = ""
+        line = ""
+    if current_chunk.strip():
+        chunks.append(current_chunk.strip())
+        timestamps.append(len(tokens) - 1)
+    return chunks, timestamps
+
+
+def segmenter_chunks(tokens, segmenter=None):
+    """Run tokens through SentenceSegmenter, returning chunks and the token index that released each"""
+    segmenter = segmenter or SentenceSegmenter()
+    chunks = []
+    timestamps = []
+    for index, token in enumerate(tokens):
+        for chunk in segmenter.feed(token):
+            chunks.append(chunk)
+            timestamps.append(index)
+    for chunk in segmenter.flush():
+        chunks.append(chunk)
+        timestamps.append(len(tokens) - 1)
+    return chunks, timestamps
+
+
+def time_to_first_audio(chunks, timestamps, args):
+    """Seconds until the first chunk would finish synthesizing"""
+    if not chunks:
+        return float('nan')
+    released = (timestamps[0] + 1) / args.tokens_per_second
+    synthesis = args.tts_overhead + len(chunks[0]) * args.tts_cost_per_char
+    return released + synthesis
+
+
+def throughput(tokens, chunker, repeat):
+    """Characters per second pushed through chunker"""
+    chars = sum(len(token) for token in tokens)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        chunker(tokens)
+    elapsed = time.perf_counter() - start
+    return chars * repeat / elapsed, len(tokens) * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens-per-second', type=float, default=30.0, help='simulated LLM generation rate')
+    parser.add_argument('--tts-overhead', type=float, default=0.08, help='fixed seconds per TTS call')
+    parser.add_argument('--tts-cost-per-char', type=float, default=0.004, help='TTS seconds per character')
+    parser.add_argument('--repeat', type=int, default=2000, help='iterations for the throughput test')
+    args = parser.parse_args()
+
+    tokens = tokenize(SAMPLE_RESPONSE)
+    print(f"Sample response: {len(SAMPLE_RESPONSE)} chars, {len(tokens)} tokens")
+    print(f"{'chunker':<12} {'chunks':>6} {'mean len':>9} {'max len':>8} {'stdev':>7} "
+          f"{'TTFA (s)':>9} {'Mchar/s':>8} {'Ktok/s':>8}")
+
+    for name, chunker in (("legacy", legacy_chunks), ("segmenter", segmenter_chunks)):
+        chunks, timestamps = chunker(tokens)
+        lengths = [len(chunk) for chunk in chunks]
+        chars_per_second, tokens_per_second = throughput(tokens, chunker, args.repeat)
+        print(f"{name:<12} {len(chunks):>6} {statistics.mean(lengths):>9.1f} {max(lengths):>8} "
+              f"{statistics.pstdev(lengths):>7.1f} {time_to_first_audio(chunks, timestamps, args):>9.3f} "
+              f"{chars_per_second / 1e6:>8.2f} {tokens_per_second / 1e3:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
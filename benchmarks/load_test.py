@@ -0,0 +1,245 @@
+"""Load test: many concurrent conversations against the real server code
+
+Starts WebSocketTextToAudioAssistant in-process on a local port, with a
+deterministic fake LLM token stream in place of Ollama and a fake TTS engine
+whose cost is set as a real-time factor, then drives N WebSocket clients
+through the normal protocol (connected, configure, user_message, ...,
+audio_complete). Reports time-to-first-audio, full-response latency,
+audio-seconds delivered per wall-second and RSS growth, and saves the results
+as JSON so runs can be compared.
+
+    python benchmarks/load_test.py --clients 32 --turns 3 --tts-rtf 0.2 --tts-workers 4
+    python benchmarks/load_test.py --clients 32 --compare results/previous.json
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import logging
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (AUDIO_FRAME_PREFIX, LLMBackend, SPEECH_SECONDS_PER_CHAR, WebSocketTextToAudioAssistant,
+                 process_rss_bytes)
+
+RESPONSE = ("Sure, here is a quick overview. The first step is to gather everything you need. "
+            "Next, set aside some time without distractions. After that, work through each part slowly, "
+            "checking as you go. Finally, take a short break and review what you did. "
+            "Would you like more detail on any of these steps?")
+
+
+class FakeLLMBackend(LLMBackend):
+    """Streams a fixed response word by word at a fixed token rate"""
+    name = "fake"
+
+    def __init__(self, token_delay=0.01, text=RESPONSE):
+        self.token_delay = token_delay
+        self.tokens = [word + " " for word in text.split()]
+
+    async def stream(self, prompt, model):
+        for token in self.tokens:
+            await asyncio.sleep(self.token_delay)
+            yield token
+
+
+class FakeSynthesizer:
+    def __init__(self, sample_rate):
+        self.output_sample_rate = sample_rate
+
+
+class FakeTTSEngine:
+    """Stands in for TTS.api.TTS: takes rtf seconds per second of audio it returns
+
+    With busy=True the cost is spent computing while holding the GIL
+    (like a model stepping through Python code) rather than sleeping.
+    """
+    def __init__(self, model_name=None, rtf=0.1, sample_rate=22050, busy=False):
+        self.model_name = model_name
+        self.rtf = rtf
+        self.busy = busy
+        self.synthesizer = FakeSynthesizer(sample_rate)
+        self.speakers = None
+
+    def tts(self, text, speaker=None, language=None, **kwargs):
+        seconds = len(text) * SPEECH_SECONDS_PER_CHAR
+        cost = seconds * self.rtf
+        if self.busy:
+            deadline = time.perf_counter() + cost
+            while time.perf_counter() < deadline:
+                pass
+        else:
+            time.sleep(cost)
+        sample_rate = self.synthesizer.output_sample_rate
+        t = np.arange(int(seconds * sample_rate), dtype=np.float32) / sample_rate
+        return 0.3 * np.sin(2 * np.pi * 180 * t)
+
+
+def audio_seconds(message):
+    """Seconds of audio in a binary frame or JSON audio message"""
+    if isinstance(message, bytes):
+        header_length = AUDIO_FRAME_PREFIX.unpack_from(message)[0]
+        header = json.loads(message[AUDIO_FRAME_PREFIX.size:AUDIO_FRAME_PREFIX.size + header_length])
+        pcm_bytes = len(message) - AUDIO_FRAME_PREFIX.size - header_length
+        return pcm_bytes / 2 / header['sample_rate']
+
+    data = json.loads(message)
+    if data.get('type') not in ('audio_chunk', 'audio_frame'):
+        return None
+    audio = base64.b64decode(data['audio'])
+    if data.get('format', 'wav') == 'wav':
+        with wave.open(io.BytesIO(audio)) as wav:
+            return wav.getnframes() / wav.getframerate()
+    return len(audio) / 2 / data['sample_rate']
+
+
+async def run_client(uri, index, args, results):
+    """One conversation: several turns, each timed from user_message to audio_complete"""
+    async with websockets.connect(uri, max_size=None) as websocket:
+        json.loads(await websocket.recv())  # connected
+        configure = {'type': 'configure', 'audio_transport': args.transport}
+        if args.stream_audio:
+            configure['stream_audio'] = True
+        await websocket.send(json.dumps(configure))
+        json.loads(await websocket.recv())  # configured
+
+        for turn in range(args.turns):
+            sent = time.perf_counter()
+            await websocket.send(json.dumps({'type': 'user_message', 'text': f"Client {index} turn {turn}"}))
+            first_audio = None
+            seconds = 0.0
+            while True:
+                message = await websocket.recv()
+                audio = audio_seconds(message)
+                if audio is not None:
+                    if first_audio is None:
+                        first_audio = time.perf_counter() - sent
+                    seconds += audio
+                    continue
+                data = json.loads(message)
+                if data['type'] == 'audio_complete':
+                    break
+                if data['type'] == 'error':
+                    results['errors'] += 1
+            results['ttfa'].append(first_audio if first_audio is not None else float('nan'))
+            results['latency'].append(time.perf_counter() - sent)
+            results['audio_seconds'] += seconds
+
+
+def percentiles(values):
+    values = np.asarray([value for value in values if value == value])
+    if not len(values):
+        return {'p50': None, 'p99': None, 'mean': None}
+    return {'p50': float(np.percentile(values, 50)), 'p99': float(np.percentile(values, 99)),
+            'mean': float(values.mean())}
+
+
+async def run(args):
+    def model_loader(model_name):
+        return FakeTTSEngine(model_name, rtf=args.tts_rtf, busy=args.busy)
+
+    assistant = WebSocketTextToAudioAssistant(
+        llm_backend=FakeLLMBackend(args.token_delay),
+        model_loader=model_loader,
+        cache_bytes=args.cache_mb * 1024 * 1024,
+        tts_workers=args.tts_workers,
+        replicate_models=args.replicate_models,
+        batch_window_ms=args.batch_window_ms,
+        session_inflight_limit=args.session_inflight_limit,
+        max_pending_chunks=args.max_pending_chunks,
+        warmup_text=""
+    )
+
+    server = await websockets.serve(assistant.handle_client, '127.0.0.1', 0, max_size=None)
+    uri = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    results = {'ttfa': [], 'latency': [], 'audio_seconds': 0.0, 'errors': 0}
+
+    rss_before = process_rss_bytes()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_client(uri, index, args, results) for index in range(args.clients)))
+    finally:
+        wall_seconds = time.perf_counter() - started
+        rss_after = process_rss_bytes()
+        server.close()
+        await server.wait_closed()
+        assistant.models.shutdown()
+
+    return {
+        'config': vars(args),
+        'wall_seconds': wall_seconds,
+        'turns': len(results['latency']),
+        'errors': results['errors'],
+        'ttfa_seconds': percentiles(results['ttfa']),
+        'latency_seconds': percentiles(results['latency']),
+        'audio_seconds': results['audio_seconds'],
+        'audio_seconds_per_wall_second': results['audio_seconds'] / wall_seconds,
+        'rss_growth_mb': (rss_after - rss_before) / (1024 * 1024),
+        'server_stages': assistant.metrics.summary(),
+    }
+
+
+def report(result, previous=None):
+    rows = [
+        ('TTFA p50 (s)', result['ttfa_seconds']['p50'], lambda r: r['ttfa_seconds']['p50']),
+        ('TTFA p99 (s)', result['ttfa_seconds']['p99'], lambda r: r['ttfa_seconds']['p99']),
+        ('latency p50 (s)', result['latency_seconds']['p50'], lambda r: r['latency_seconds']['p50']),
+        ('latency p99 (s)', result['latency_seconds']['p99'], lambda r: r['latency_seconds']['p99']),
+        ('audio s / wall s', result['audio_seconds_per_wall_second'], lambda r: r['audio_seconds_per_wall_second']),
+        ('RSS growth (MB)', result['rss_growth_mb'], lambda r: r['rss_growth_mb']),
+    ]
+    print(f"{result['config']['clients']} clients x {result['config']['turns']} turns: "
+          f"{result['turns']} responses in {result['wall_seconds']:.2f}s, {result['errors']} error(s)")
+    for label, value, get in rows:
+        line = f"  {label:<18} {value:>9.3f}" if value is not None else f"  {label:<18} {'-':>9}"
+        if previous is not None and value is not None and get(previous) is not None:
+            line += f"   (was {get(previous):.3f}, {value - get(previous):+.3f})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16, help='concurrent WebSocket clients')
+    parser.add_argument('--turns', type=int, default=2, help='messages each client sends, one after another')
+    parser.add_argument('--token-delay', type=float, default=0.01, help='seconds between fake LLM tokens')
+    parser.add_argument('--tts-rtf', type=float, default=0.1, help='fake TTS cost per second of audio')
+    parser.add_argument('--busy', action='store_true', help='spend fake TTS cost holding the GIL instead of sleeping')
+    parser.add_argument('--tts-workers', type=int, default=1)
+    parser.add_argument('--replicate-models', action='store_true', help='one fake engine per TTS worker')
+    parser.add_argument('--batch-window-ms', type=float, default=0)
+    parser.add_argument('--session-inflight-limit', type=int, default=1)
+    parser.add_argument('--max-pending-chunks', type=int, default=4)
+    parser.add_argument('--cache-mb', type=int, default=0, help='synthesis cache size (0 so every turn synthesizes)')
+    parser.add_argument('--transport', choices=['json', 'binary'], default='binary')
+    parser.add_argument('--stream-audio', action='store_true', help='receive progressive audio frames')
+    parser.add_argument('--verbose', action='store_true', help="keep the server's per-chunk logging")
+    parser.add_argument('--output', help='write results as JSON here')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger('app').setLevel(logging.WARNING)
+        logging.getLogger('websockets').setLevel(logging.WARNING)
+
+    result = asyncio.run(run(args))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    report(result, previous)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()